@@ -4,12 +4,15 @@ Secure endpoints and commands for testing and management
 """
 
 import os
+import re
+import heapq
 import logging
 import asyncio
 from typing import Optional, List
 from fastapi import APIRouter, Header, HTTPException, Depends
 from pydantic import BaseModel
 from google.cloud import firestore
+from google.api_core.exceptions import NotFound
 from utils.timezone_utils import israel_now_isoformat
 
 logger = logging.getLogger(__name__)
@@ -25,6 +28,9 @@ TESTING_MODE_ENABLED = True
 ADMIN_PHONE_NUMBERS = os.getenv("ADMIN_PHONE_NUMBERS", "").split(",")
 ADMIN_PHONE_NUMBERS = [num.strip() for num in ADMIN_PHONE_NUMBERS if num.strip()]
 
+# Trailing [CONFLICT:...] metadata the AI appends for itself (stripped before display)
+CONFLICT_METADATA_RE = re.compile(r'\s*\[CONFLICT:[^\]]+\]\s*$')
+
 
 # Dependency for API token authentication
 async def verify_admin_token(x_admin_token: str = Header(None)) -> bool:
@@ -122,8 +128,10 @@ async def change_user_phone_number(
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
+        users_collection = db.collection("users")
+        
         # Get original user data
-        original_doc = db.collection("users").document(phone_number).get()
+        original_doc = users_collection.document(phone_number).get()
         
         if not original_doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
@@ -134,10 +142,10 @@ async def change_user_phone_number(
         user_data["last_seen"] = israel_now_isoformat()
         
         # Create new document
-        db.collection("users").document(new_phone).set(user_data)
+        users_collection.document(new_phone).set(user_data)
         
         # Delete original
-        db.collection("users").document(phone_number).delete()
+        users_collection.document(phone_number).delete()
         
         logger.info(f"✅ Admin: Changed phone {phone_number} → {new_phone}")
         
@@ -171,14 +179,9 @@ async def delete_user(
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
+        # Delete with an exists precondition - one round-trip instead of get + delete
         doc_ref = db.collection("users").document(phone_number)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Delete the document
-        doc_ref.delete()
+        doc_ref.delete(option=db.write_option(exists=True))
         
         logger.info(f"🗑️  Admin: Deleted user {phone_number}")
         
@@ -187,6 +190,8 @@ async def delete_user(
             "message": f"User {phone_number} deleted successfully"
         }
     
+    except NotFound:
+        raise HTTPException(status_code=404, detail="User not found")
     except Exception as e:
         logger.error(f"❌ Error deleting user: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -254,7 +259,7 @@ async def reset_all_users(
         POST /admin/users/reset-all?confirm=DELETE_ALL_USERS
         Header: X-Admin-Token: your_secret_token
     """
-    from database import get_db
+    from database import get_db, batch_delete
     db = get_db()
     if not db:
         raise HTTPException(status_code=503, detail="Database not available")
@@ -266,12 +271,10 @@ async def reset_all_users(
         )
     
     try:
-        deleted_count = 0
-        docs = db.collection("users").stream()
+        docs = db.collection("users").select([]).stream()  # references only - nothing is read
         
-        for doc in docs:
-            doc.reference.delete()
-            deleted_count += 1
+        # Delete in batched commits instead of one round-trip per user
+        deleted_count = batch_delete(db, (doc.reference for doc in docs))
         
         logger.warning(f"⚠️  Admin: Deleted all {deleted_count} users!")
         
@@ -510,6 +513,7 @@ async def list_users(
     try:
         users = []
         docs = db.collection("users").stream()
+        search_lower = search.lower() if search else None
         
         for doc in docs:
             user_data = doc.to_dict()
@@ -527,8 +531,7 @@ async def list_users(
             }
             
             # Apply search filter
-            if search:
-                search_lower = search.lower()
+            if search_lower:
                 phone = user_info.get("phone_number", "").lower()
                 name = user_info.get("name", "").lower()
                 if search_lower not in phone and search_lower not in name:
@@ -536,13 +539,11 @@ async def list_users(
             
             users.append(user_info)
         
-        # Sort users
-        reverse = (order == "desc")
-        users.sort(key=lambda x: x.get(sort_by, ""), reverse=reverse)
-        
-        # Pagination
+        # Sort + paginate: only the first offset+limit users need ordering
+        # (nlargest/nsmallest match sorted(...)[:n], ties included)
+        select_top = heapq.nlargest if order == "desc" else heapq.nsmallest
         total_count = len(users)
-        users_page = users[offset:offset + limit]
+        users_page = select_top(offset + limit, users, key=lambda x: x.get(sort_by, ""))[offset:]
         
         return {
             "users": users_page,
@@ -608,7 +609,7 @@ async def get_user_history(
     
     try:
         doc_ref = db.collection("users").document(phone_number)
-        doc = doc_ref.get()
+        doc = doc_ref.get(field_paths=["chat_history"])
         
         if not doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
@@ -712,10 +713,13 @@ async def get_active_rides(
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        users_docs = db.collection("users").stream()
+        users_docs = db.collection("users").select(
+            ["phone_number", "name", "driver_rides", "hitchhiker_requests"]
+        ).stream()
         
         drivers = []
         hitchhikers = []
+        destination_lower = destination.lower() if destination else None
         
         for doc in users_docs:
             user_data = doc.to_dict()
@@ -730,7 +734,7 @@ async def get_active_rides(
                         continue
                     
                     # Apply destination filter
-                    if destination and destination.lower() not in ride.get("destination", "").lower():
+                    if destination_lower and destination_lower not in ride.get("destination", "").lower():
                         continue
                     
                     # Get route coordinates - support multiple formats
@@ -772,7 +776,7 @@ async def get_active_rides(
                         continue
                     
                     # Apply destination filter
-                    if destination and destination.lower() not in request.get("destination", "").lower():
+                    if destination_lower and destination_lower not in request.get("destination", "").lower():
                         continue
                     
                     # Get route coordinates - support multiple formats
@@ -893,16 +897,14 @@ async def update_ride(
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
+        rides_key = "driver_rides" if ride_type == "driver" else "hitchhiker_requests"
         doc_ref = db.collection("users").document(phone_number)
-        doc = doc_ref.get()
+        doc = doc_ref.get(field_paths=[rides_key])
         if not doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
 
         user_data = doc.to_dict()
-        rides_list = user_data.get(
-            "driver_rides" if ride_type == "driver" else "hitchhiker_requests",
-            []
-        )
+        rides_list = user_data.get(rides_key, [])
         ride = next((r for r in rides_list if r.get("id") == ride_id), None)
         if not ride:
             raise HTTPException(status_code=404, detail="Ride not found")
@@ -977,7 +979,9 @@ async def export_rides_csv(
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        users_docs = db.collection("users").stream()
+        users_docs = db.collection("users").select(
+            ["phone_number", "name", "driver_rides", "hitchhiker_requests"]
+        ).stream()
         
         # Create CSV in memory
         output = io.StringIO()
@@ -1079,25 +1083,28 @@ async def list_matches(
             query = query.where("timestamp", "<=", end_date)
 
         docs = query.stream()
-        matches = []
         destination_filter = None
         if destination and destination != "undefined":
             destination_filter = destination.strip().lower()
 
+        # Stream once: count every match for the total, keep only the requested page
+        matches_page = []
+        total = 0
+        page_end = offset + limit
         for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-
+            data = None
             if destination_filter:
+                data = doc.to_dict()
                 dest = (data.get("destination") or "").lower()
                 matched_dest = (data.get("matched_destination") or "").lower()
                 if destination_filter not in dest and destination_filter not in matched_dest:
                     continue
 
-            matches.append(data)
-
-        total = len(matches)
-        matches_page = matches[offset:offset + limit]
+            if offset <= total < page_end:
+                data = data or doc.to_dict()
+                data["id"] = doc.id
+                matches_page.append(data)
+            total += 1
 
         return {
             "matches": matches_page,
@@ -1173,8 +1180,8 @@ async def handle_admin_whatsapp_command(
             new_number = parts[3]
             
             # Get user data
-            collection_name = f"{collection_prefix}users"
-            original_doc = db.collection(collection_name).document(phone_number).get()
+            users_collection = db.collection(f"{collection_prefix}users")
+            original_doc = users_collection.document(phone_number).get()
             
             if original_doc.exists:
                 user_data = original_doc.to_dict()
@@ -1182,10 +1189,10 @@ async def handle_admin_whatsapp_command(
                 user_data["last_seen"] = israel_now_isoformat()
                 
                 # Create new document
-                db.collection(collection_name).document(new_number).set(user_data)
+                users_collection.document(new_number).set(user_data)
                 
                 # Delete original
-                db.collection(collection_name).document(phone_number).delete()
+                users_collection.document(phone_number).delete()
                 
                 logger.info(f"✅ Admin WhatsApp: Changed {phone_number} → {new_number}")
                 
@@ -1260,7 +1267,10 @@ async def trigger_match_for_ride(
     try:
         # Get user data
         collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        doc = db.collection(collection_name).document(phone_number).get()
+        rides_key = "driver_rides" if ride_type == "driver" else "hitchhiker_requests"
+        doc = db.collection(collection_name).document(phone_number).get(
+            field_paths=["name", rides_key]
+        )
         
         if not doc.exists:
             raise HTTPException(status_code=404, detail=f"User {phone_number} not found")
@@ -1268,18 +1278,16 @@ async def trigger_match_for_ride(
         user_data = doc.to_dict()
         
         # Find the specific ride
-        rides_list = user_data.get("driver_rides" if ride_type == "driver" else "hitchhiker_requests", [])
-        ride = None
-        for r in rides_list:
-            if r.get("id") == ride_id:
-                ride = r.copy()
-                ride["phone_number"] = phone_number
-                ride["name"] = user_data.get("name", "Unknown")
-                break
+        rides_list = user_data.get(rides_key, [])
+        ride = next((r for r in rides_list if r.get("id") == ride_id), None)
         
         if not ride:
             raise HTTPException(status_code=404, detail=f"Ride {ride_id} not found")
         
+        # The ride dict was just decoded for this request - annotate it in place, no copy needed
+        ride["phone_number"] = phone_number
+        ride["name"] = user_data.get("name", "Unknown")
+        
         # Run matching
         logger.info(f"🔍 Admin: Triggering match for {ride_type} {ride_id} ({phone_number})")
         matches = await find_matches_for_new_record(ride_type, ride, collection_prefix)
@@ -1317,7 +1325,7 @@ async def update_hitchhiker_coordinates(
     
     try:
         collection_name = f"{collection_prefix}users"
-        users_docs = db.collection(collection_name).stream()
+        users_docs = db.collection(collection_name).select(["phone_number", "hitchhiker_requests"]).stream()
         
         updated_count = 0
         skipped_count = 0
@@ -1399,7 +1407,7 @@ async def send_sandbox_message(
     Test users use the same collections and logic as regular users,
     but messages appear in the Sandbox UI instead of WhatsApp
     """
-    from database import get_db, get_or_create_user, add_message_to_history
+    from database import get_db, get_or_create_user, add_message_to_history, add_messages_to_history
     from services.ai_service import process_message_with_ai
     from config import get_welcome_message
     
@@ -1419,15 +1427,9 @@ async def send_sandbox_message(
         if is_new_user:
             logger.info(f"   Step 3: New user, sending welcome...")
             welcome_msg = get_welcome_message(user_data.get("name"))
-            await add_message_to_history(
+            await add_messages_to_history(
                 request.phone_number,
-                "user",
-                request.message
-            )
-            await add_message_to_history(
-                request.phone_number, 
-                "assistant", 
-                welcome_msg
+                [("user", request.message), ("assistant", welcome_msg)]
             )
             logger.info(f"   Step 4: Welcome sent, returning response")
             return {
@@ -1452,15 +1454,9 @@ async def send_sandbox_message(
             
             if admin_response:
                 logger.info(f"   Step 5: Admin command handled, saving to history...")
-                await add_message_to_history(
-                    request.phone_number, 
-                    "user", 
-                    request.message
-                )
-                await add_message_to_history(
-                    request.phone_number, 
-                    "assistant", 
-                    admin_response
+                await add_messages_to_history(
+                    request.phone_number,
+                    [("user", request.message), ("assistant", admin_response)]
                 )
                 logger.info(f"   Step 6: Admin response ready, returning")
                 return {
@@ -1482,33 +1478,23 @@ async def send_sandbox_message(
         
         # Use regular AI processing - WhatsApp messages are handled automatically
         # (test users will have messages saved to history instead of WhatsApp)
-        await process_message_with_ai(
+        # The reply is returned directly - no need to re-read it from chat history
+        response = await process_message_with_ai(
             request.phone_number, 
             request.message, 
             user_data,
             is_new_user=False
-        )
+        ) or "מעבד..."
         
         logger.info(f"   Step 5: AI processing complete")
         
-        # Get the latest response from chat history
-        updated_user = await get_or_create_user(request.phone_number)
-        updated_user_data = updated_user[0]
-        chat_history = updated_user_data.get("chat_history", [])
-        
-        # Get last assistant message
-        response = "מעבד..."
-        for msg in reversed(chat_history):
-            if msg.get("role") == "assistant":
-                response = msg.get("content", "")
-                break
-        
         # Clean metadata from response (meant for AI only, not for user display)
-        import re
-        response = re.sub(r'\s*\[CONFLICT:[^\]]+\]\s*$', '', response)
+        # Most responses carry no metadata - skip the regex entirely for them
+        if "[CONFLICT:" in response:
+            response = CONFLICT_METADATA_RE.sub('', response)
         
         response_preview = response[:200] if response and len(response) > 200 else response
-        logger.info(f"   Step 6: Retrieved response from history (length: {len(response)})")
+        logger.info(f"   Step 6: Got AI response (length: {len(response)})")
         logger.info(f"   Response preview: {response_preview}{'...' if response and len(response) > 200 else ''}")
         
         logger.info(f"   Step 7: Preparing final response...")
@@ -1542,11 +1528,15 @@ async def get_sandbox_users(
         if not db:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        # Test users are in the regular 'users' collection
+        # Test users are in the regular 'users' collection - fetch all of them in one batched read
+        users_collection = db.collection("users")
+        refs = [users_collection.document(phone) for phone in TEST_USERS]
+        docs_by_phone = {doc.id: doc for doc in db.get_all(refs)}
+        
         users = []
         for phone in TEST_USERS:
-            doc = db.collection("users").document(phone).get()
-            if doc.exists:
+            doc = docs_by_phone.get(phone)
+            if doc and doc.exists:
                 user_data = doc.to_dict()
                 chat_history = user_data.get("chat_history", [])[-10:]  # Last 10 messages
                 logger.info(f"📊 User {phone}: {len(chat_history)} messages in history")
@@ -1583,13 +1573,16 @@ async def get_sandbox_all_rides(
         if not db:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        # Test users are in the regular 'users' collection
+        # Test users are in the regular 'users' collection - fetch all of them in one batched read
+        users_collection = db.collection("users")
+        refs = [users_collection.document(phone) for phone in TEST_USERS]
+        docs_by_phone = {doc.id: doc for doc in db.get_all(refs)}
         all_drivers = []
         all_hitchhikers = []
         
         for phone in TEST_USERS:
-            doc = db.collection("users").document(phone).get()
-            if not doc.exists:
+            doc = docs_by_phone.get(phone)
+            if not doc or not doc.exists:
                 continue
                 
             user_data = doc.to_dict()
@@ -1652,20 +1645,25 @@ async def reset_sandbox(
             raise HTTPException(status_code=503, detail="Database not available")
         
         # Clear data for test users only
+        users_collection = db.collection("users")
         cleared_count = 0
         
-        for phone in TEST_USERS:
-            doc_ref = db.collection("users").document(phone)
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                # Clear rides, requests, and chat history but keep the user
-                doc_ref.update({
-                    "driver_rides": [],
-                    "hitchhiker_requests": [],
-                    "chat_history": []
-                })
-                cleared_count += 1
+        # One batched existence read (masked to phone_number) + one batched commit, instead of
+        # an update round-trip per test user (a batch fails as a whole on a missing doc)
+        refs = [users_collection.document(phone) for phone in TEST_USERS]
+        batch = db.batch()
+        for doc in db.get_all(refs, field_paths=["phone_number"]):
+            if not doc.exists:
+                continue
+            # Clear rides, requests, and chat history but keep the user
+            batch.update(doc.reference, {
+                "driver_rides": [],
+                "hitchhiker_requests": [],
+                "chat_history": []
+            })
+            cleared_count += 1
+        if cleared_count:
+            batch.commit()
         
         logger.info(f"🧹 Sandbox reset: cleared data for {cleared_count} test users")
         
@@ -1696,8 +1694,8 @@ async def calculate_routes_for_rides(
         if not db:
             raise HTTPException(status_code=503, detail="Database not available")
         
-        # Get all users
-        users_ref = db.collection("users").stream()
+        # Get all users - only the fields needed to find rides without routes
+        users_ref = db.collection("users").select(["phone_number", "driver_rides"]).stream()
         
         tasks_created = 0
         rides_processed = 0
@@ -1709,10 +1707,13 @@ async def calculate_routes_for_rides(
             # Process driver rides
             driver_rides = user_data.get("driver_rides", [])
             for ride in driver_rides:
+                # Inactive rides are never matched - no route needed
+                if not ride.get("active", True):
+                    continue
                 rides_processed += 1
                 
-                # Check if route data exists
-                if not ride.get("route_coordinates"):
+                # Check if route data exists (flat format, or legacy nested format)
+                if not (ride.get("route_coordinates_flat") or ride.get("route_coordinates")):
                     origin = ride.get("origin")
                     destination = ride.get("destination")
                     ride_id = ride.get("id")
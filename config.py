@@ -101,6 +101,17 @@ HELP_MESSAGE = """📚 מדריך טרמפים - גברעם
 
 NON_TEXT_MESSAGE_HEBREW = "סליחה, אני מטפל רק בהודעות טקסט 📝"
 
+# Day name translation (English day name -> Hebrew abbreviation) for display
+DAY_TRANSLATION = {
+    "Sunday": "א'",
+    "Monday": "ב'",
+    "Tuesday": "ג'",
+    "Wednesday": "ד'",
+    "Thursday": "ה'",
+    "Friday": "ו'",
+    "Saturday": "ש'"
+}
+
 def get_welcome_message(name=None):
     return WELCOME_MESSAGE.format(name=name or "חבר")
 
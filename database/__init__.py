@@ -3,14 +3,18 @@ Database operations
 """
 
 from .firestore_client import (
+    MAX_BATCH_WRITES,
+    batch_delete,
     initialize_db,
     get_db,
     get_or_create_user,
     add_message_to_history,
+    add_messages_to_history,
     update_user_role_and_data,
     add_user_ride_or_request,
     get_user_rides_and_requests,
     remove_user_ride_or_request,
+    remove_user_rides_or_requests,
     update_user_ride_or_request,
     get_drivers_by_route,
     get_hitchhiker_requests,
@@ -18,14 +22,18 @@ from .firestore_client import (
 )
 
 __all__ = [
+    "MAX_BATCH_WRITES",
+    "batch_delete",
     "initialize_db",
     "get_db",
     "get_or_create_user",
     "add_message_to_history",
+    "add_messages_to_history",
     "update_user_role_and_data",
     "add_user_ride_or_request",
     "get_user_rides_and_requests",
     "remove_user_ride_or_request",
+    "remove_user_rides_or_requests",
     "update_user_ride_or_request",
     "get_drivers_by_route",
     "get_hitchhiker_requests",
@@ -4,6 +4,7 @@ Calculate various metrics for the admin dashboard
 """
 
 import logging
+import time
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta, timezone
 from collections import Counter
@@ -11,6 +12,30 @@ from google.cloud import firestore
 
 logger = logging.getLogger(__name__)
 
+# Dashboard stats scan every user document - cache results briefly so
+# dashboard refreshes and repeated tab switches don't re-scan the collection
+STATS_CACHE_TTL_SECONDS = 60
+_stats_cache: Dict[tuple, tuple] = {}  # {key: (expires_at, value)}
+
+
+def _get_cached_stats(key: tuple) -> Optional[Any]:
+    """Return a cached stats value if it hasn't expired yet"""
+    entry = _stats_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _set_cached_stats(key: tuple, value: Any) -> Any:
+    """Cache a stats value for STATS_CACHE_TTL_SECONDS and return it"""
+    now = time.monotonic()
+    # Drop expired entries so keys built from request params (e.g. trends days) don't pile up
+    for expired_key in [k for k, (expires_at, _) in _stats_cache.items() if expires_at <= now]:
+        del _stats_cache[expired_key]
+    _stats_cache[key] = (now + STATS_CACHE_TTL_SECONDS, value)
+    return value
+
+
 def _parse_iso_to_utc(value: str) -> Optional[datetime]:
     """Parse ISO datetime and return UTC-aware datetime."""
     if not value:
@@ -24,6 +49,17 @@ def _parse_iso_to_utc(value: str) -> Optional[datetime]:
         return None
 
 
+def _parse_hour(time_str: Any) -> Optional[int]:
+    """Extract the hour from an "HH:MM" departure time (None if missing/invalid)."""
+    if not time_str or not isinstance(time_str, str):
+        return None
+    hour, _, _ = time_str.partition(":")
+    try:
+        return int(hour)
+    except ValueError:
+        return None
+
+
 async def get_overview_stats(db: firestore.Client) -> Dict[str, Any]:
     """
     Get overview statistics for dashboard
@@ -38,6 +74,10 @@ async def get_overview_stats(db: firestore.Client) -> Dict[str, Any]:
         - matches_week: Matches this week
         - matches_month: Matches this month
     """
+    cached = _get_cached_stats(("overview",))
+    if cached is not None:
+        return cached
+    
     try:
         now = datetime.now(timezone.utc)
         seven_days_ago = now - timedelta(days=7)
@@ -47,7 +87,9 @@ async def get_overview_stats(db: firestore.Client) -> Dict[str, Any]:
         month_start = now - timedelta(days=30)
         
         # Get all users
-        users_docs = db.collection("users").stream()
+        users_docs = db.collection("users").select(
+            ["created_at", "last_seen", "driver_rides", "hitchhiker_requests"]
+        ).stream()
         
         total_users = 0
         new_users_7d = 0
@@ -88,7 +130,7 @@ async def get_overview_stats(db: firestore.Client) -> Dict[str, Any]:
         matches_week = 0
         matches_month = 0
         
-        return {
+        return _set_cached_stats(("overview",), {
             "total_users": total_users,
             "new_users_7d": new_users_7d,
             "active_users_30d": active_users_30d,
@@ -98,7 +140,7 @@ async def get_overview_stats(db: firestore.Client) -> Dict[str, Any]:
             "matches_week": matches_week,
             "matches_month": matches_month,
             "timestamp": now.isoformat()
-        }
+        })
     
     except Exception as e:
         logger.error(f"❌ Error calculating overview stats: {e}")
@@ -127,6 +169,10 @@ async def get_trends_stats(db: firestore.Client, days: int = 30) -> Dict[str, An
         - new_rides_by_day: List of {date, count} for new rides
         - popular_destinations: List of {destination, count} for top destinations
     """
+    cached = _get_cached_stats(("trends", days))
+    if cached is not None:
+        return cached
+    
     try:
         now = datetime.now(timezone.utc)
         start_date = now - timedelta(days=days)
@@ -137,7 +183,9 @@ async def get_trends_stats(db: firestore.Client, days: int = 30) -> Dict[str, An
         destination_counter = Counter()
         
         # Get all users
-        users_docs = db.collection("users").stream()
+        users_docs = db.collection("users").select(
+            ["created_at", "driver_rides", "hitchhiker_requests"]
+        ).stream()
         
         for doc in users_docs:
             user_data = doc.to_dict()
@@ -201,12 +249,12 @@ async def get_trends_stats(db: firestore.Client, days: int = 30) -> Dict[str, An
             for dest, count in destination_counter.most_common(10)
         ]
         
-        return {
+        return _set_cached_stats(("trends", days), {
             "new_users_by_day": new_users_by_day,
             "new_rides_by_day": new_rides_by_day,
             "popular_destinations": popular_destinations,
             "timestamp": now.isoformat()
-        }
+        })
     
     except Exception as e:
         logger.error(f"❌ Error calculating trends: {e}")
@@ -225,10 +273,16 @@ async def get_peak_hours(db: firestore.Client) -> List[Dict[str, Any]]:
     Returns:
         List of {hour, count} for each hour of the day
     """
+    cached = _get_cached_stats(("peak_hours",))
+    if cached is not None:
+        return cached
+    
     try:
         hour_counter = Counter()
         
-        users_docs = db.collection("users").stream()
+        users_docs = db.collection("users").select(
+            ["driver_rides", "hitchhiker_requests"]
+        ).stream()
         
         for doc in users_docs:
             user_data = doc.to_dict()
@@ -237,25 +291,17 @@ async def get_peak_hours(db: firestore.Client) -> List[Dict[str, Any]]:
             driver_rides = user_data.get("driver_rides", [])
             for ride in driver_rides:
                 if ride.get("active", True):
-                    time_str = ride.get("departure_time", "")
-                    if time_str:
-                        try:
-                            hour = int(time_str.split(":")[0])
-                            hour_counter[hour] += 1
-                        except:
-                            pass
+                    hour = _parse_hour(ride.get("departure_time"))
+                    if hour is not None:
+                        hour_counter[hour] += 1
             
             # Count hitchhiker departure times
             hitchhiker_requests = user_data.get("hitchhiker_requests", [])
             for request in hitchhiker_requests:
                 if request.get("active", True):
-                    time_str = request.get("departure_time", "")
-                    if time_str:
-                        try:
-                            hour = int(time_str.split(":")[0])
-                            hour_counter[hour] += 1
-                        except:
-                            pass
+                    hour = _parse_hour(request.get("departure_time"))
+                    if hour is not None:
+                        hour_counter[hour] += 1
         
         # Format as list of hours
         peak_hours = [
@@ -263,7 +309,7 @@ async def get_peak_hours(db: firestore.Client) -> List[Dict[str, Any]]:
             for hour in range(24)
         ]
         
-        return peak_hours
+        return _set_cached_stats(("peak_hours",), peak_hours)
     
     except Exception as e:
         logger.error(f"❌ Error calculating peak hours: {e}")
@@ -3,8 +3,9 @@ Firestore database operations
 Handles all user data persistence for the hitchhiking bot
 """
 
+import asyncio
 import logging
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any, Iterable
 from google.cloud import firestore
 from utils.timezone_utils import israel_now_isoformat
 
@@ -19,11 +20,18 @@ logger = logging.getLogger(__name__)
 # Global Firestore client
 _db = None
 
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+# Cached users collection references, keyed by collection prefix ("" = production)
+_users_collections: Dict[str, firestore.CollectionReference] = {}
+
 
 def initialize_db() -> Optional[firestore.Client]:
     """Initialize Firestore client"""
     global _db
     
+    _users_collections.clear()
     try:
         if GOOGLE_CLOUD_PROJECT:
             _db = firestore.Client(project=GOOGLE_CLOUD_PROJECT)
@@ -43,13 +51,82 @@ def get_db() -> Optional[firestore.Client]:
     return _db
 
 
-async def get_or_create_user(phone_number: str, name: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+def _get_users_collection(collection_prefix: str = "") -> firestore.CollectionReference:
+    """Get the (cached) users collection reference for the given prefix"""
+    collection = _users_collections.get(collection_prefix)
+    if collection is None:
+        collection = _db.collection(f"{collection_prefix}users")
+        _users_collections[collection_prefix] = collection
+    return collection
+
+
+def _fetch_users(collection_prefix: str, fields: List[str]) -> List[Dict[str, Any]]:
+    """Stream all users (projected to fields) - blocking, run via asyncio.to_thread"""
+    docs = _get_users_collection(collection_prefix).select(fields).stream()
+    return [doc.to_dict() for doc in docs]
+
+
+def batch_delete(db: firestore.Client, refs: Iterable[firestore.DocumentReference]) -> int:
+    """Delete documents in batched commits (MAX_BATCH_WRITES per commit) - returns the number deleted"""
+    deleted_count = 0
+    batch = db.batch()
+    pending = 0
+    for ref in refs:
+        batch.delete(ref)
+        pending += 1
+        if pending == MAX_BATCH_WRITES:
+            batch.commit()
+            deleted_count += pending
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+        deleted_count += pending
+    return deleted_count
+
+
+def _driver_record(phone_number: str, user_name: Optional[str], ride: Dict, ride_id: Optional[str]) -> Dict[str, Any]:
+    """Build the driver dict used by matching (shared by list-based and legacy data)"""
+    return {
+        "phone_number": phone_number,
+        "name": user_name,
+        "origin": ride.get("origin", "גברעם"),
+        "destination": ride.get("destination"),
+        "days": ride.get("days", []),
+        "travel_date": ride.get("travel_date"),  # Include travel_date for one-time rides
+        "departure_time": ride.get("departure_time"),
+        "return_time": ride.get("return_time"),
+        "auto_approve_matches": ride.get("auto_approve_matches", True),
+        "ride_id": ride_id
+    }
+
+
+def _hitchhiker_record(phone_number: str, user_name: Optional[str], request: Dict, request_id: Optional[str]) -> Dict[str, Any]:
+    """Build the hitchhiker dict used by matching (shared by list-based and legacy data)"""
+    return {
+        "phone_number": phone_number,
+        "name": user_name,
+        "origin": request.get("origin", "גברעם"),
+        "destination": request.get("destination"),
+        "travel_date": request.get("travel_date"),
+        "departure_time": request.get("departure_time"),
+        "flexibility": request.get("flexibility", "flexible"),
+        "request_id": request_id
+    }
+
+
+async def get_or_create_user(
+    phone_number: str,
+    name: Optional[str] = None,
+    first_message: Optional[str] = None
+) -> Tuple[Dict[str, Any], bool]:
     """
     Get user from Firestore or create if doesn't exist
     
     Args:
         phone_number: User's phone number (document ID)
         name: User's WhatsApp profile name (optional)
+        first_message: User message to store in the new user's history (optional)
     
     Returns:
         tuple: (user_data, is_new_user)
@@ -58,7 +135,7 @@ async def get_or_create_user(phone_number: str, name: Optional[str] = None) -> T
         return {"phone_number": phone_number, "name": name, "chat_history": []}, False
     
     try:
-        doc_ref = _db.collection("users").document(phone_number)
+        doc_ref = _get_users_collection().document(phone_number)
         doc = doc_ref.get()
         
         if doc.exists:
@@ -71,16 +148,24 @@ async def get_or_create_user(phone_number: str, name: Optional[str] = None) -> T
             
             return user_data, False
         else:
+            now = israel_now_isoformat()
             user_data = {
                 "phone_number": phone_number,
                 "name": name,
                 "notification_level": DEFAULT_NOTIFICATION_LEVEL,
                 "driver_rides": [],
                 "hitchhiker_requests": [],
-                "created_at": israel_now_isoformat(),
-                "last_seen": israel_now_isoformat(),
+                "created_at": now,
+                "last_seen": now,
                 "chat_history": []
             }
+            if first_message:
+                # Saved as part of the create - no separate history write needed
+                user_data["chat_history"].append({
+                    "role": "user",
+                    "content": first_message,
+                    "timestamp": now
+                })
             doc_ref.set(user_data)
             return user_data, True
     except Exception as e:
@@ -98,6 +183,20 @@ async def add_message_to_history(phone_number: str, role: str, content: str) ->
         role: Message role ('user' or 'assistant')
         content: Message content
     
+    Returns:
+        True if successful, False otherwise
+    """
+    return await add_messages_to_history(phone_number, [(role, content)])
+
+
+async def add_messages_to_history(phone_number: str, messages: List[Tuple[str, str]]) -> bool:
+    """
+    Add several messages to chat history with a single read and write (keep last N messages)
+    
+    Args:
+        phone_number: User's phone number
+        messages: (role, content) pairs in chronological order
+    
     Returns:
         True if successful, False otherwise
     """
@@ -105,27 +204,30 @@ async def add_message_to_history(phone_number: str, role: str, content: str) ->
         return False
     
     try:
-        doc_ref = _db.collection("users").document(phone_number)
-        doc = doc_ref.get()
+        doc_ref = _get_users_collection().document(phone_number)
+        # Only the history is needed - skip the user's rides/requests
+        doc = doc_ref.get(field_paths=["chat_history"])
         
         if not doc.exists:
             return False
         
         user_data = doc.to_dict()
         chat_history = user_data.get("chat_history", [])
+        now = israel_now_isoformat()
         
-        chat_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": israel_now_isoformat()
-        })
+        for role, content in messages:
+            chat_history.append({
+                "role": role,
+                "content": content,
+                "timestamp": now
+            })
         
         # Keep only last N messages
         chat_history = chat_history[-MAX_CHAT_HISTORY:]
         
         doc_ref.update({
             "chat_history": chat_history,
-            "last_seen": israel_now_isoformat()
+            "last_seen": now
         })
         
         return True
@@ -154,7 +256,7 @@ async def update_user_role_and_data(
         return False
     
     try:
-        doc_ref = _db.collection("users").document(phone_number)
+        doc_ref = _get_users_collection().document(phone_number)
         
         update_data = {
             "role": role,
@@ -174,6 +276,14 @@ async def update_user_role_and_data(
         return False
 
 
+def _active_rides_and_requests(driver_rides: List[Dict], hitchhiker_requests: List[Dict]) -> Dict[str, List[Dict]]:
+    """Filter a user's ride lists down to active records"""
+    return {
+        "driver_rides": [r for r in driver_rides if r.get("active", True)],
+        "hitchhiker_requests": [r for r in hitchhiker_requests if r.get("active", True)]
+    }
+
+
 async def add_user_ride_or_request(
     phone_number: str,
     ride_type: str,  # 'driver' or 'hitchhiker' to indicate which list to add to
@@ -191,49 +301,53 @@ async def add_user_ride_or_request(
         collection_prefix: Prefix for collection name (e.g., "test_" for sandbox)
     
     Returns:
-        Dict with 'success' (bool), 'is_duplicate' (bool), and optional 'message' (str)
+        Dict with 'success' (bool), 'is_duplicate' (bool), optional 'message' (str),
+        and the user's active 'driver_rides' / 'hitchhiker_requests' after the write
+        (so callers can show the updated list without reading the user again)
     """
     if not _db:
         return {"success": False, "is_duplicate": False, "message": "שגיאת חיבור למסד נתונים"}
     
     try:
-        collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        doc_ref = _db.collection(collection_name).document(phone_number)
-        doc = doc_ref.get()
+        doc_ref = _get_users_collection(collection_prefix).document(phone_number)
+        # Only the ride lists are needed - skip chat_history
+        doc = doc_ref.get(field_paths=["driver_rides", "hitchhiker_requests"])
         
         if not doc.exists:
             # Create new user
+            now = israel_now_isoformat()
             user_data = {
                 "phone_number": phone_number,
                 "notification_level": DEFAULT_NOTIFICATION_LEVEL,
                 "driver_rides": [ride_data] if ride_type == "driver" else [],
                 "hitchhiker_requests": [ride_data] if ride_type == "hitchhiker" else [],
-                "created_at": israel_now_isoformat(),
-                "last_seen": israel_now_isoformat(),
+                "created_at": now,
+                "last_seen": now,
                 "chat_history": []
             }
             doc_ref.set(user_data)
-            return {"success": True, "is_duplicate": False}
+            return {
+                "success": True,
+                "is_duplicate": False,
+                "driver_rides": user_data["driver_rides"],
+                "hitchhiker_requests": user_data["hitchhiker_requests"]
+            }
         
         # Update existing user
         user_data = doc.to_dict()
+        driver_rides = user_data.get("driver_rides", [])
+        hitchhiker_requests = user_data.get("hitchhiker_requests", [])
         
         # Add to appropriate list
         if ride_type == "driver":
-            driver_rides = user_data.get("driver_rides", [])
             
-            # Check for duplicate (same destination and time)
-            is_duplicate = False
-            for existing_ride in driver_rides:
-                if (existing_ride.get("destination") == ride_data.get("destination") and 
-                    existing_ride.get("departure_time") == ride_data.get("departure_time") and
-                    existing_ride.get("active", True)):
-                    is_duplicate = True
-                    destination = ride_data.get("destination", "")
-                    origin = ride_data.get("origin", "גברעם")
-                    time = ride_data.get("departure_time", "")
-                    logger.warning(f"⚠️ Duplicate ride detected for {phone_number}: מ{origin} ל{destination}")
-                    break
+            # Check for duplicate (same destination and time) - compare one key tuple per ride
+            new_key = (ride_data.get("destination"), ride_data.get("departure_time"))
+            is_duplicate = any(
+                existing_ride.get("active", True) and
+                (existing_ride.get("destination"), existing_ride.get("departure_time")) == new_key
+                for existing_ride in driver_rides
+            )
             
             if not is_duplicate:
                 driver_rides.append(ride_data)
@@ -245,28 +359,23 @@ async def add_user_ride_or_request(
                 destination = ride_data.get("destination", "")
                 origin = ride_data.get("origin", "גברעם")
                 time = ride_data.get("departure_time", "")
+                logger.warning(f"⚠️ Duplicate ride detected for {phone_number}: מ{origin} ל{destination}")
                 return {
                     "success": False,
                     "is_duplicate": True,
-                    "message": f"הנסיעה מ{origin} ל{destination} בשעה {time} כבר קיימת ברשימה שלך! 📋"
+                    "message": f"הנסיעה מ{origin} ל{destination} בשעה {time} כבר קיימת ברשימה שלך! 📋",
+                    **_active_rides_and_requests(driver_rides, hitchhiker_requests)
                 }
         
         elif ride_type == "hitchhiker":
-            hitchhiker_requests = user_data.get("hitchhiker_requests", [])
-            
-            # Check for duplicate (same destination and date/time)
-            is_duplicate = False
-            for existing_request in hitchhiker_requests:
-                if (existing_request.get("destination") == ride_data.get("destination") and 
-                    existing_request.get("travel_date") == ride_data.get("travel_date") and
-                    existing_request.get("departure_time") == ride_data.get("departure_time") and
-                    existing_request.get("active", True)):
-                    is_duplicate = True
-                    destination = ride_data.get("destination", "")
-                    origin = ride_data.get("origin", "גברעם")
-                    date = ride_data.get("travel_date", "")
-                    logger.warning(f"⚠️ Duplicate request detected for {phone_number}: מ{origin} ל{destination}")
-                    break
+            # Check for duplicate (same destination and date/time) - compare one key tuple per request
+            new_key = (ride_data.get("destination"), ride_data.get("travel_date"), ride_data.get("departure_time"))
+            is_duplicate = any(
+                existing_request.get("active", True) and
+                (existing_request.get("destination"), existing_request.get("travel_date"),
+                 existing_request.get("departure_time")) == new_key
+                for existing_request in hitchhiker_requests
+            )
             
             if not is_duplicate:
                 hitchhiker_requests.append(ride_data)
@@ -279,13 +388,19 @@ async def add_user_ride_or_request(
                 origin = ride_data.get("origin", "גברעם")
                 date = ride_data.get("travel_date", "")
                 time = ride_data.get("departure_time", "")
+                logger.warning(f"⚠️ Duplicate request detected for {phone_number}: מ{origin} ל{destination}")
                 return {
                     "success": False,
                     "is_duplicate": True,
-                    "message": f"הבקשה מ{origin} ל{destination} בתאריך {date} בשעה {time} כבר קיימת ברשימה שלך! 📋"
+                    "message": f"הבקשה מ{origin} ל{destination} בתאריך {date} בשעה {time} כבר קיימת ברשימה שלך! 📋",
+                    **_active_rides_and_requests(driver_rides, hitchhiker_requests)
                 }
         
-        return {"success": True, "is_duplicate": False}
+        return {
+            "success": True,
+            "is_duplicate": False,
+            **_active_rides_and_requests(driver_rides, hitchhiker_requests)
+        }
     
     except Exception as e:
         logger.error(f"❌ Error adding ride/request: {str(e)}")
@@ -301,26 +416,27 @@ async def get_user_rides_and_requests(phone_number: str, collection_prefix: str
         collection_prefix: Prefix for collection name (e.g., "test_" for sandbox)
     
     Returns:
-        Dictionary with driver_rides and hitchhiker_requests lists
+        Dictionary with driver_rides and hitchhiker_requests lists (and the user's name when known)
     """
     if not _db:
         return {"driver_rides": [], "hitchhiker_requests": []}
     
     try:
-        collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        doc_ref = _db.collection(collection_name).document(phone_number)
-        doc = doc_ref.get()
+        doc_ref = _get_users_collection(collection_prefix).document(phone_number)
+        # Only the name and ride lists are returned - skip chat_history
+        doc = doc_ref.get(field_paths=["name", "driver_rides", "hitchhiker_requests"])
         
         if not doc.exists:
             return {"driver_rides": [], "hitchhiker_requests": []}
         
         user_data = doc.to_dict()
-        driver_rides = [r for r in user_data.get("driver_rides", []) if r.get("active", True)]
-        hitchhiker_requests = [r for r in user_data.get("hitchhiker_requests", []) if r.get("active", True)]
         
         return {
-            "driver_rides": driver_rides,
-            "hitchhiker_requests": hitchhiker_requests
+            "name": user_data.get("name"),
+            **_active_rides_and_requests(
+                user_data.get("driver_rides", []),
+                user_data.get("hitchhiker_requests", [])
+            )
         }
     
     except Exception as e:
@@ -350,9 +466,9 @@ async def remove_user_ride_or_request(
         return False
     
     try:
-        collection_name = f"{collection_prefix}users"
-        doc_ref = _db.collection(collection_name).document(phone_number)
-        doc = doc_ref.get()
+        doc_ref = _get_users_collection(collection_prefix).document(phone_number)
+        # Only the ride lists are needed - skip chat_history
+        doc = doc_ref.get(field_paths=["driver_rides", "hitchhiker_requests"])
         
         if not doc.exists:
             return False
@@ -364,6 +480,10 @@ async def remove_user_ride_or_request(
             updated = False
             for ride in driver_rides:
                 if ride.get("id") == ride_id:
+                    if not ride.get("active", True):
+                        # Already removed (e.g. a repeated request) - nothing to write
+                        logger.info(f"ℹ️ Driver ride {ride_id} already inactive")
+                        return True
                     ride["active"] = False
                     updated = True
                     break
@@ -377,6 +497,10 @@ async def remove_user_ride_or_request(
             updated = False
             for request in hitchhiker_requests:
                 if request.get("id") == ride_id:
+                    if not request.get("active", True):
+                        # Already removed (e.g. a repeated request) - nothing to write
+                        logger.info(f"ℹ️ Hitchhiker request {ride_id} already inactive")
+                        return True
                     request["active"] = False
                     updated = True
                     break
@@ -392,6 +516,64 @@ async def remove_user_ride_or_request(
         return False
 
 
+async def remove_user_rides_or_requests(
+    phone_number: str,
+    ride_ids_by_role: Dict[str, List[str]],
+    collection_prefix: str = ""
+) -> Dict[str, int]:
+    """
+    Remove (deactivate) several rides/requests with a single read and a single write
+    
+    Args:
+        phone_number: User's phone number
+        ride_ids_by_role: {'driver': [ride ids], 'hitchhiker': [request ids]}
+        collection_prefix: Optional prefix for collection name (e.g., "test_")
+    
+    Returns:
+        Number of records removed per role (e.g., {"driver": 2, "hitchhiker": 0})
+    """
+    removed = {role: 0 for role in ride_ids_by_role}
+    if not _db:
+        return removed
+    
+    list_keys = {"driver": "driver_rides", "hitchhiker": "hitchhiker_requests"}
+    
+    try:
+        doc_ref = _get_users_collection(collection_prefix).document(phone_number)
+        # Only the ride lists are needed - skip chat_history
+        doc = doc_ref.get(field_paths=["driver_rides", "hitchhiker_requests"])
+        
+        if not doc.exists:
+            return removed
+        
+        user_data = doc.to_dict()
+        updates = {}
+        
+        for role, ride_ids in ride_ids_by_role.items():
+            list_key = list_keys.get(role)
+            if not list_key or not ride_ids:
+                continue
+            
+            ids_to_remove = set(ride_ids)
+            records = user_data.get(list_key, [])
+            for record in records:
+                if record.get("id") in ids_to_remove and record.get("active", True):
+                    record["active"] = False
+                    removed[role] += 1
+            
+            if removed[role]:
+                updates[list_key] = records
+        
+        if updates:
+            doc_ref.update(updates)
+        
+        return removed
+    
+    except Exception as e:
+        logger.error(f"❌ Error removing rides/requests: {str(e)}")
+        return {role: 0 for role in ride_ids_by_role}
+
+
 async def update_user_ride_or_request(
     phone_number: str,
     role: str,
@@ -416,9 +598,9 @@ async def update_user_ride_or_request(
         return False
     
     try:
-        collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        doc_ref = _db.collection(collection_name).document(phone_number)
-        doc = doc_ref.get()
+        doc_ref = _get_users_collection(collection_prefix).document(phone_number)
+        # Only the ride lists are needed - skip chat_history
+        doc = doc_ref.get(field_paths=["driver_rides", "hitchhiker_requests"])
         
         if not doc.exists:
             return False
@@ -430,6 +612,10 @@ async def update_user_ride_or_request(
             updated = False
             for ride in driver_rides:
                 if ride.get("id") == ride_id:
+                    if all(ride.get(key) == value for key, value in updates.items()):
+                        # Nothing changed - skip the write
+                        logger.info(f"ℹ️ Driver ride {ride_id} already up to date")
+                        return True
                     # Update only the provided fields
                     for key, value in updates.items():
                         ride[key] = value
@@ -446,6 +632,10 @@ async def update_user_ride_or_request(
             updated = False
             for request in hitchhiker_requests:
                 if request.get("id") == ride_id:
+                    if all(request.get(key) == value for key, value in updates.items()):
+                        # Nothing changed - skip the write
+                        logger.info(f"ℹ️ Hitchhiker request {ride_id} already up to date")
+                        return True
                     # Update only the provided fields
                     for key, value in updates.items():
                         request[key] = value
@@ -485,12 +675,14 @@ async def get_drivers_by_route(
     
     try:
         # Get all users and check their driver_rides
-        collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        docs = _db.collection(collection_name).stream()
+        # (projection skips chat_history and other fields matching never reads)
+        # (the scan runs off the event loop so concurrent searches overlap)
+        users = await asyncio.to_thread(
+            _fetch_users, collection_prefix, ["phone_number", "name", "driver_rides", "driver_data"]
+        )
         
         drivers = []
-        for doc in docs:
-            user_data = doc.to_dict()
+        for user_data in users:
             phone_number = user_data.get("phone_number")
             user_name = user_data.get("name")  # Get driver's name
             
@@ -505,17 +697,8 @@ async def get_drivers_by_route(
                 # matching based on route proximity (e.g., driver to Tel Aviv
                 # can match with hitchhiker to Ashkelon if Ashkelon is on the route)
                 
-                drivers.append({
-                    "phone_number": phone_number,
-                    "name": user_name,  # Include driver's name
-                    "origin": ride.get("origin", "גברעם"),  # Include origin
-                    "destination": ride.get("destination"),
-                    "days": ride.get("days", []),
-                    "travel_date": ride.get("travel_date"),  # Include travel_date for one-time rides
-                    "departure_time": ride.get("departure_time"),
-                    "return_time": ride.get("return_time"),
-                    "auto_approve_matches": ride.get("auto_approve_matches", True),  # Include approval setting
-                    "ride_id": ride.get("id"),
+                driver = _driver_record(phone_number, user_name, ride, ride.get("id"))
+                driver.update({
                     # Include route data for on-route matching
                     "route_coordinates_flat": ride.get("route_coordinates_flat"),
                     "route_num_points": ride.get("route_num_points"),
@@ -523,24 +706,14 @@ async def get_drivers_by_route(
                     "route_threshold_km": ride.get("route_threshold_km"),
                     "route_calculation_pending": ride.get("route_calculation_pending", False)
                 })
+                drivers.append(driver)
             
             # Also check legacy driver_data for backward compatibility
             driver_info = user_data.get("driver_data", {})
             if driver_info and driver_info.get("destination"):
                 # Note: No destination filtering for legacy data either
                 
-                drivers.append({
-                    "phone_number": phone_number,
-                    "name": user_name,  # Include name for legacy data too
-                    "origin": driver_info.get("origin", "גברעם"),  # Include origin
-                    "destination": driver_info.get("destination"),
-                    "days": driver_info.get("days", []),
-                    "travel_date": driver_info.get("travel_date"),  # Include travel_date for one-time rides
-                    "departure_time": driver_info.get("departure_time"),
-                    "return_time": driver_info.get("return_time"),
-                    "auto_approve_matches": driver_info.get("auto_approve_matches", True),  # Include approval setting
-                    "ride_id": "legacy"
-                })
+                drivers.append(_driver_record(phone_number, user_name, driver_info, "legacy"))
         
         return drivers
     
@@ -568,12 +741,14 @@ async def get_hitchhiker_requests(
     
     try:
         # Get all users and check their hitchhiker_requests
-        collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        docs = _db.collection(collection_name).stream()
+        # (projection skips chat_history and other fields matching never reads)
+        # (the scan runs off the event loop so concurrent searches overlap)
+        users = await asyncio.to_thread(
+            _fetch_users, collection_prefix, ["phone_number", "name", "hitchhiker_requests", "hitchhiker_data"]
+        )
         
         hitchhikers = []
-        for doc in docs:
-            user_data = doc.to_dict()
+        for user_data in users:
             phone_number = user_data.get("phone_number")
             user_name = user_data.get("name")  # Get hitchhiker's name
             
@@ -588,16 +763,7 @@ async def get_hitchhiker_requests(
                 # matching based on route proximity (e.g., hitchhiker to Ashkelon
                 # can match with driver to Tel Aviv if Ashkelon is on the route)
                 
-                hitchhikers.append({
-                    "phone_number": phone_number,
-                    "name": user_name,  # Include hitchhiker's name
-                    "origin": request.get("origin", "גברעם"),  # Include origin
-                    "destination": request.get("destination"),
-                    "travel_date": request.get("travel_date"),
-                    "departure_time": request.get("departure_time"),
-                    "flexibility": request.get("flexibility", "flexible"),
-                    "request_id": request.get("id")
-                })
+                hitchhikers.append(_hitchhiker_record(phone_number, user_name, request, request.get("id")))
             
             # Also check legacy hitchhiker_data for backward compatibility
             hitchhiker_info = user_data.get("hitchhiker_data", {})
@@ -607,16 +773,7 @@ async def get_hitchhiker_requests(
                     if destination.lower() not in hitchhiker_info["destination"].lower():
                         continue
                 
-                hitchhikers.append({
-                    "phone_number": phone_number,
-                    "name": user_name,  # Include name for legacy data too
-                    "origin": hitchhiker_info.get("origin", "גברעם"),  # Include origin
-                    "destination": hitchhiker_info.get("destination"),
-                    "travel_date": hitchhiker_info.get("travel_date"),
-                    "departure_time": hitchhiker_info.get("departure_time"),
-                    "flexibility": hitchhiker_info.get("flexibility", "flexible"),
-                    "request_id": "legacy"
-                })
+                hitchhikers.append(_hitchhiker_record(phone_number, user_name, hitchhiker_info, "legacy"))
         
         return hitchhikers
     
@@ -630,7 +787,7 @@ async def update_ride_route_data(
     ride_id: str,
     route_data: Dict,
     collection_prefix: str = ""
-) -> bool:
+) -> Optional[Dict[str, Any]]:
     """
     Update route data for a ride (called from background task or lazy loading)
     
@@ -641,25 +798,25 @@ async def update_ride_route_data(
         collection_prefix: Prefix for collection name (e.g., "test_" for sandbox)
         
     Returns:
-        True if successful, False otherwise
+        The updated ride (as saved) if successful, None otherwise
     """
     if not _db:
         logger.warning("⚠️ Database not initialized")
-        return False
+        return None
     
     try:
-        collection_name = f"{collection_prefix}users" if collection_prefix else "users"
-        doc_ref = _db.collection(collection_name).document(phone_number)
-        doc = doc_ref.get()
+        doc_ref = _get_users_collection(collection_prefix).document(phone_number)
+        # Only the driver rides are needed - skip chat_history and requests
+        doc = doc_ref.get(field_paths=["driver_rides"])
         
         if not doc.exists:
             logger.warning(f"⚠️ User {phone_number} not found")
-            return False
+            return None
         
         user_data = doc.to_dict()
         driver_rides = user_data.get("driver_rides", [])
         
-        updated = False
+        updated_ride = None
         for ride in driver_rides:
             if ride.get("id") == ride_id:
                 # Flatten coordinates to avoid Firestore nested array limit
@@ -673,89 +830,18 @@ async def update_ride_route_data(
                 ride["route_distance_km"] = route_data["distance_km"]
                 ride["route_threshold_km"] = route_data["threshold_km"]
                 ride["route_calculation_pending"] = False  # Mark as complete
-                updated = True
+                updated_ride = ride
                 logger.info(f"📍 Saving {len(route_data['coordinates'])} coordinates ({len(flat_coords)} values) to Firestore")
                 break
         
-        if updated:
+        if updated_ride:
             doc_ref.update({"driver_rides": driver_rides})
             logger.info(f"✅ Updated route data for ride {ride_id}: {route_data['distance_km']:.1f}km")
-            return True
+            return updated_ride
         else:
             logger.warning(f"⚠️ Ride {ride_id} not found for user {phone_number}")
-            return False
+            return None
         
     except Exception as e:
         logger.error(f"❌ Error updating route data: {e}")
-        return False
-
-
-# ==================== SANDBOX FUNCTIONS ====================
-# These functions are used for testing in the admin sandbox environment
-
-async def get_or_create_user_sandbox(phone_number: str, name: str, collection_prefix: str = "test_"):
-    """Get or create a user in sandbox/test environment"""
-    db = get_db()
-    if not db:
-        return None, False
-    
-    collection_name = f"{collection_prefix}users"
-    user_ref = db.collection(collection_name).document(phone_number)
-    user_doc = user_ref.get()
-    
-    if user_doc.exists:
-        return user_doc.to_dict(), False
-    else:
-        # Create new test user
-        new_user = {
-            "phone_number": phone_number,
-            "name": name,
-            "chat_history": [],
-            "driver_rides": [],
-            "hitchhiker_rides": [],
-            "created_at": israel_now_isoformat(),
-            "last_message_at": israel_now_isoformat()
-        }
-        user_ref.set(new_user)
-        logger.info(f"🧪 Created sandbox user: {phone_number} in {collection_name}")
-        return new_user, True
-
-
-async def add_message_to_history_sandbox(phone_number: str, role: str, content: str, collection_prefix: str = "test_"):
-    """Add a message to user's chat history in sandbox/test environment"""
-    db = get_db()
-    if not db:
-        return False
-    
-    collection_name = f"{collection_prefix}users"
-    user_ref = db.collection(collection_name).document(phone_number)
-    
-    message = {
-        "role": role,
-        "content": content,
-        "timestamp": israel_now_isoformat()
-    }
-    
-    try:
-        user_doc = user_ref.get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            chat_history = user_data.get("chat_history", [])
-            chat_history.append(message)
-            
-            # Keep last 100 messages
-            if len(chat_history) > 100:
-                chat_history = chat_history[-100:]
-            
-            user_ref.update({
-                "chat_history": chat_history,
-                "last_message_at": israel_now_isoformat()
-            })
-            return True
-        else:
-            logger.warning(f"User {phone_number} not found in {collection_name}")
-            return False
-    except Exception as e:
-        logger.error(f"Error adding message to sandbox history: {e}")
-        return False
-
+        return None
@@ -8,6 +8,7 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from google.cloud import firestore
 from utils.timezone_utils import israel_now_isoformat
+from .firestore_client import batch_delete
 
 logger = logging.getLogger(__name__)
 
@@ -207,17 +208,10 @@ async def clean_old_logs(db: firestore.Client, days: int = 90) -> int:
         
         deleted_count = 0
         
-        # Clean error logs
-        error_docs = db.collection("error_logs").where("timestamp", "<", cutoff_date).stream()
-        for doc in error_docs:
-            doc.reference.delete()
-            deleted_count += 1
-        
-        # Clean activity logs
-        activity_docs = db.collection("system_logs").where("timestamp", "<", cutoff_date).stream()
-        for doc in activity_docs:
-            doc.reference.delete()
-            deleted_count += 1
+        # Clean error logs and activity logs (references only, deleted in batched commits)
+        for collection_name in ("error_logs", "system_logs"):
+            old_docs = db.collection(collection_name).where("timestamp", "<", cutoff_date).select([]).stream()
+            deleted_count += batch_delete(db, (doc.reference for doc in old_docs))
         
         logger.info(f"✅ Cleaned {deleted_count} old logs (older than {days} days)")
         return deleted_count
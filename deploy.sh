@@ -41,6 +41,15 @@ fi
 echo -e "${YELLOW}🔧 Setting project...${NC}"
 gcloud config set project $PROJECT_ID
 
+# Deploy Firestore indexes (dashboard log/match queries need the composite indexes)
+echo -e "${YELLOW}🗂️  Deploying Firestore indexes...${NC}"
+if command -v firebase &> /dev/null; then
+    firebase deploy --only firestore:indexes --project $PROJECT_ID
+else
+    echo -e "${YELLOW}⚠️  firebase CLI not installed - skipping indexes (see firestore.indexes.json)${NC}"
+fi
+echo ""
+
 echo -e "${YELLOW}📦 Building and deploying with Cloud Build...${NC}"
 echo "   (This will build the React frontend automatically inside Docker)"
 echo ""
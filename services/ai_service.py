@@ -1,5 +1,10 @@
 """AI service using Gemini 2.0 Flash"""
+import asyncio
 import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
 from google import genai
 from google.genai import types
 from config import GEMINI_API_KEY, AI_CONTEXT_MESSAGES, AI_CONTEXT_MAX_AGE_HOURS
@@ -101,6 +106,9 @@ user: "כן"
 **אל תתבלבל!** אם המשתמש אומר "כן" בלי קונטקסט אחר, תמיד תבדוק את ההודעה האחרונה שלי!
 """
 
+# Prefixes of debug text the AI sometimes returns instead of calling a function
+DEBUG_REPLY_PREFIXES = ("[קורא ל-", "אתה: [קורא")
+
 # Function declarations
 FUNCTIONS = [
     {
@@ -298,7 +306,17 @@ FUNCTIONS = [
     }
 ]
 
-def filter_recent_messages(history: list, max_age_hours: int = 1) -> list:
+# Gemini client - created on first use and reused for all messages
+_gemini_client = None
+
+def _get_gemini_client() -> genai.Client:
+    """Get the shared Gemini client (keeps its HTTP connections warm between messages)"""
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+    return _gemini_client
+
+def filter_recent_messages(history: list, max_age_hours: int = 1, max_messages: Optional[int] = None) -> list:
     """
     Filter chat history to only include messages from the last N hours.
     This ensures AI context stays relevant and recent.
@@ -306,11 +324,11 @@ def filter_recent_messages(history: list, max_age_hours: int = 1) -> list:
     Args:
         history: List of chat messages with timestamps
         max_age_hours: Maximum age of messages in hours (default: 1)
+        max_messages: Keep only the newest N matching messages (default: all)
         
     Returns:
         Filtered list of recent messages
     """
-    from datetime import datetime, timedelta
     from utils import get_israel_now
     
     if not history:
@@ -319,7 +337,8 @@ def filter_recent_messages(history: list, max_age_hours: int = 1) -> list:
     now = get_israel_now()
     cutoff_time = now - timedelta(hours=max_age_hours)
     
-    recent_messages = []
+    # Bounded deque - older matches fall off instead of accumulating
+    recent_messages = deque(maxlen=max_messages)
     for msg in history:
         timestamp_str = msg.get("timestamp")
         if not timestamp_str:
@@ -336,10 +355,10 @@ def filter_recent_messages(history: list, max_age_hours: int = 1) -> list:
             # Parsing failed = include message (fail-safe)
             recent_messages.append(msg)
     
-    return recent_messages
+    return list(recent_messages)
 
-async def process_message_with_ai(phone_number: str, message_text: str, user_data: dict, is_new_user: bool = False):
-    """Process message with Gemini AI"""
+async def process_message_with_ai(phone_number: str, message_text: str, user_data: dict, is_new_user: bool = False) -> str:
+    """Process message with Gemini AI and return the reply that was sent to the user"""
     from database import add_message_to_history
     from whatsapp.whatsapp_service import send_whatsapp_message
     from services.function_handlers import (
@@ -354,8 +373,9 @@ async def process_message_with_ai(phone_number: str, message_text: str, user_dat
     from utils import get_israel_now
     
     if not GEMINI_API_KEY:
-        await send_whatsapp_message(phone_number, "מצטער, שירות ה-AI לא זמין כרגע")
-        return
+        reply = "מצטער, שירות ה-AI לא זמין כרגע"
+        await send_whatsapp_message(phone_number, reply)
+        return reply
     
     # Add current date/time context for the AI (Israel timezone)
     now = get_israel_now()
@@ -363,18 +383,15 @@ async def process_message_with_ai(phone_number: str, message_text: str, user_dat
     
     # Build chat history - filter by time first, then take last N messages
     all_history = user_data.get("chat_history", [])
-    # Step 1: Filter by time (only last 1 hour)
-    recent_history = filter_recent_messages(all_history, AI_CONTEXT_MAX_AGE_HOURS)
-    # Step 2: Take last 10 messages from recent ones
-    history = recent_history[-AI_CONTEXT_MESSAGES:]
+    # Filter by time (only last 1 hour) and keep the last 10 messages from recent ones
+    history = filter_recent_messages(all_history, AI_CONTEXT_MAX_AGE_HOURS, AI_CONTEXT_MESSAGES)
     messages = [{"role": msg["role"], "parts": [{"text": msg["content"]}]} for msg in history]
     messages.append({"role": "user", "parts": [{"text": message_text + current_context}]})
     
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
+        client = _get_gemini_client()
         
         # Call Gemini 2.0 Flash with function calling preference (with timeout)
-        import asyncio
         
         async def call_gemini_with_timeout():
             # Note: google.genai doesn't have async support yet, so we run in executor
@@ -398,20 +415,20 @@ async def process_message_with_ai(phone_number: str, message_text: str, user_dat
             )
         
         logger.info("🤖 Calling Gemini API...")
-        import time
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
             response = await asyncio.wait_for(call_gemini_with_timeout(), timeout=45.0)
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             if elapsed > 10:
-                logger.warning(f"⚠️ Gemini API was SLOW: {elapsed:.2f}s")
+                logger.warning("⚠️ Gemini API was SLOW: %.2fs", elapsed)
             else:
-                logger.info(f"✅ Gemini API response received in {elapsed:.2f}s")
+                logger.info("✅ Gemini API response received in %.2fs", elapsed)
         except asyncio.TimeoutError:
-            elapsed = time.time() - start_time
-            logger.error(f"⏱️ Gemini API timeout after {elapsed:.2f}s")
-            await send_whatsapp_message(phone_number, "⏳ השרת עמוס כרגע. נסה שוב בעוד 10-20 שניות 🔄")
-            return
+            elapsed = time.perf_counter() - start_time
+            logger.error("⏱️ Gemini API timeout after %.2fs", elapsed)
+            reply = "⏳ השרת עמוס כרגע. נסה שוב בעוד 10-20 שניות 🔄"
+            await send_whatsapp_message(phone_number, reply)
+            return reply
         
         # Handle response - check for function call or text
         first_part = response.candidates[0].content.parts[0]
@@ -463,11 +480,11 @@ async def process_message_with_ai(phone_number: str, message_text: str, user_dat
                     new_role_heb = "נסיעת נהג" if new_role == "driver" else "בקשה לטרמפ"
                     
                     # Format question with hidden metadata for AI
-                    time = parts[5] if len(parts) > 5 else "08:00"
+                    departure_time = parts[5] if len(parts) > 5 else "08:00"
                     # Clean message for user (without metadata)
                     reply_to_user = f"יש לך {old_role_heb} ל{dest} ב-{date}. למחוק אותה וליצור {new_role_heb}?"
                     # Full message with metadata for AI history
-                    reply_for_history = f"{reply_to_user} [CONFLICT:{old_role}:{record_num}:{new_role}:{dest}:{date}:{time}]"
+                    reply_for_history = f"{reply_to_user} [CONFLICT:{old_role}:{record_num}:{new_role}:{dest}:{date}:{departure_time}]"
                     logger.info(f"✅ Detected conflict, asking user: {reply_to_user}")
                 else:
                     logger.error(f"❌ Invalid DUPLICATE_CONFLICT format: {result}")
@@ -481,7 +498,7 @@ async def process_message_with_ai(phone_number: str, message_text: str, user_dat
             reply = first_part.text if hasattr(first_part, 'text') else "קיבלתי!"
             
             # Filter out debug messages that AI sometimes returns
-            if reply.startswith("[קורא ל-") or reply.startswith("אתה: [קורא"):
+            if reply.startswith(DEBUG_REPLY_PREFIXES):
                 logger.warning(f"⚠️ AI returned debug message instead of function call: {reply}")
                 reply = "מעבד את הבקשה..."
             
@@ -492,202 +509,10 @@ async def process_message_with_ai(phone_number: str, message_text: str, user_dat
         # Note: User message already saved in webhook handler
         # send_whatsapp_message auto-saves assistant message to history
         await send_whatsapp_message(phone_number, reply_to_user)
-        
-    except Exception as e:
-        logger.error(f"AI error: {e}", exc_info=True)
-        await send_whatsapp_message(phone_number, "מצטער, הייתה בעיה. נסה שוב")
-
-
-# ==================== SANDBOX AI PROCESSING ====================
-
-async def process_message_with_ai_sandbox(phone_number: str, message_text: str, user_data: dict, collection_prefix: str = "test_"):
-    """
-    Process a message with AI for sandbox/testing environment.
-    Uses the REAL production code but with test collections and without WhatsApp.
-    """
-    from database.firestore_client import add_message_to_history_sandbox
-    from services.function_handlers import (
-        handle_update_user_records,
-        handle_view_user_records,
-        handle_delete_user_record,
-        handle_delete_all_user_records,
-        handle_update_user_record,
-        handle_show_help,
-        handle_resolve_duplicate
-    )
-    from utils import get_israel_now
-    
-    logger.info(f"🤖 AI Service START: phone={phone_number}, msg_len={len(message_text)}, collection={collection_prefix}")
-    
-    if not GEMINI_API_KEY:
-        logger.error("❌ No Gemini API key configured!")
-        return "מצטער, שירות ה-AI לא זמין כרגע"
-    
-    logger.info(f"   AI Step 1: Building context...")
-    # Add current date/time context
-    now = get_israel_now()
-    current_context = f"\n\n[מידע נוכחי: תאריך היום: {now.strftime('%Y-%m-%d')}, שעה: {now.strftime('%H:%M')}, יום: {now.strftime('%A')}]"
-    
-    # Build chat history - filter by time first, then take last N messages
-    all_history = user_data.get("chat_history", [])
-    # Step 1: Filter by time (only last 1 hour)
-    recent_history = filter_recent_messages(all_history, AI_CONTEXT_MAX_AGE_HOURS)
-    # Step 2: Take last 10 messages from recent ones
-    history = recent_history[-AI_CONTEXT_MESSAGES:]
-    messages = [{"role": msg["role"], "parts": [{"text": msg["content"]}]} for msg in history]
-    messages.append({"role": "user", "parts": [{"text": message_text + current_context}]})
-    
-    logger.info(f"   AI Step 2: Context ready - {len(history)} history messages, current message length: {len(message_text)}")
-    
-    try:
-        logger.info(f"   AI Step 3: Creating Gemini client...")
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        logger.info(f"   AI Step 4: Client created successfully")
-        
-        # Add timeout for sandbox too (same as production)
-        import asyncio
-        
-        async def call_gemini_with_timeout():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None,
-                lambda: client.models.generate_content(
-                    model="gemini-2.0-flash-exp",
-                    contents=messages,
-                    config=types.GenerateContentConfig(
-                        system_instruction=SYSTEM_PROMPT,
-                        tools=[types.Tool(function_declarations=FUNCTIONS)],
-                        temperature=0.1,
-                    )
-                )
-            )
-        
-        logger.info("   AI Step 5: Starting Gemini API call (sandbox)...")
-        max_retries = 1  # רק ניסיון אחד (לא 2) כדי לא לחכות יותר מדי
-        response = None
-        for attempt in range(max_retries):
-            try:
-                if attempt > 0:
-                    logger.info(f"   AI Step 5.{attempt}: 🔄 Retry attempt {attempt}/{max_retries-1}...")
-                else:
-                    logger.info(f"   AI Step 5.{attempt}: First attempt, calling Gemini...")
-                
-                import time
-                start_time = time.time()
-                response = await asyncio.wait_for(call_gemini_with_timeout(), timeout=45.0)  # 45 שניות במקום 120
-                elapsed = time.time() - start_time
-                
-                if elapsed > 10:
-                    logger.warning(f"   AI Step 6: ⚠️ Gemini API was SLOW: {elapsed:.2f}s (>10s threshold)")
-                else:
-                    logger.info(f"   AI Step 6: ✅ Gemini API response received (sandbox) in {elapsed:.2f}s")
-                break
-            except asyncio.TimeoutError:
-                elapsed = time.time() - start_time
-                if attempt < max_retries - 1:
-                    logger.warning(f"   AI Step 5.{attempt}: ⏱️ Gemini API timeout after {elapsed:.2f}s (attempt {attempt+1}/{max_retries})")
-                    logger.warning(f"   Message length: {len(message_text)}, History length: {len(history)}")
-                    logger.info(f"   Retrying immediately...")
-                    # No sleep - try again immediately
-                else:
-                    logger.error(f"   AI Step 5.{attempt}: ⏱️ FINAL TIMEOUT after {elapsed:.2f}s")
-                    logger.error(f"   Context: msg_len={len(message_text)}, history={len(history)}, phone={phone_number}")
-                    return "⏳ השרת עמוס כרגע (Gemini AI). נסה שוב בעוד 10-20 שניות 🔄"
-            except Exception as e:
-                logger.error(f"   AI Step 5.{attempt}: ❌ Exception during API call: {type(e).__name__}: {str(e)}")
-                if attempt < max_retries - 1:
-                    logger.info(f"   AI Step 5.{attempt}: Retrying after exception...")
-                    await asyncio.sleep(1)
-                else:
-                    raise
-        
-        if not response:
-            logger.error("   AI Step 6: ❌ No response from Gemini API after retries")
-            return "מצטער, הייתה בעיה בתקשורת עם השרת. נסה שוב"
-        
-        logger.info(f"   AI Step 7: Parsing response...")
-        first_part = response.candidates[0].content.parts[0]
-        
-        # Check if function call
-        fc = getattr(first_part, 'function_call', None)
-        if fc:
-            func_name = fc.name
-            func_args = dict(fc.args)
-            
-            logger.info(f"   AI Step 8: 🧪 Function call detected: {func_name}")
-            logger.info(f"   AI Step 8: Function args: {func_args}")
-            
-            # Execute REAL function handlers with collection_prefix
-            logger.info(f"   AI Step 9: Executing handler for {func_name}...")
-            if func_name == "ask_clarification":
-                # Return the question wrapped in a dict
-                result = {"status": "success", "message": func_args.get("question", "?")}
-            elif func_name == "update_user_records":
-                result = await handle_update_user_records(phone_number, func_args, collection_prefix, send_whatsapp=True)
-            elif func_name == "view_user_records":
-                result = await handle_view_user_records(phone_number, collection_prefix)
-            elif func_name == "delete_user_record":
-                result = await handle_delete_user_record(phone_number, func_args, collection_prefix)
-            elif func_name == "delete_all_user_records":
-                result = await handle_delete_all_user_records(phone_number, func_args, collection_prefix)
-            elif func_name == "update_user_record":
-                result = await handle_update_user_record(phone_number, func_args, collection_prefix, send_whatsapp=True)
-            elif func_name == "show_help":
-                result = await handle_show_help(phone_number, collection_prefix)
-            elif func_name == "resolve_duplicate":
-                result = await handle_resolve_duplicate(phone_number, func_args, collection_prefix, send_whatsapp=True)
-            else:
-                logger.warning(f"   AI Step 9: Unknown function: {func_name}")
-                result = {"message": "פונקציה לא מוכרת"}
-            
-            logger.info(f"   AI Step 10: Handler completed, result length: {len(str(result))}")
-            
-            # Check if result is a DUPLICATE_CONFLICT string
-            if isinstance(result, str) and result.startswith("DUPLICATE_CONFLICT"):
-                # Parse: DUPLICATE_CONFLICT|new_role|old_role|dest|date|time|record_num
-                parts = result.split("|")
-                if len(parts) >= 7:
-                    new_role = parts[1]
-                    old_role = parts[2]
-                    dest = parts[3]
-                    date = parts[4]
-                    record_num = parts[6]
-                    
-                    # Translate roles to Hebrew
-                    old_role_heb = "בקשה לטרמפ" if old_role == "hitchhiker" else "נסיעת נהג"
-                    new_role_heb = "נסיעת נהג" if new_role == "driver" else "בקשה לטרמפ"
-                    
-                    # Format question with hidden metadata for AI
-                    time = parts[5] if len(parts) > 5 else "08:00"
-                    # Clean message for user (without metadata)
-                    reply_to_user = f"יש לך {old_role_heb} ל{dest} ב-{date}. למחוק אותה וליצור {new_role_heb}?"
-                    # Full message with metadata for AI history
-                    reply_for_history = f"{reply_to_user} [CONFLICT:{old_role}:{record_num}:{new_role}:{dest}:{date}:{time}]"
-                    logger.info(f"   AI Step 10.1: Detected conflict, asking user: {reply_to_user}")
-                else:
-                    logger.error(f"   AI Step 10.1: Invalid DUPLICATE_CONFLICT format: {result}")
-                    reply_to_user = "מצטער, הייתה בעיה בזיהוי הנסיעה הקיימת. נסה שוב"
-                    reply_for_history = reply_to_user
-            else:
-                reply_to_user = result.get("message", "בוצע!")
-                reply_for_history = reply_to_user
-        else:
-            # Regular text response
-            reply = first_part.text if hasattr(first_part, 'text') else "קיבלתי!"
-            
-            # Filter out debug messages that AI sometimes returns
-            if reply.startswith("[קורא ל-") or reply.startswith("אתה: [קורא"):
-                logger.warning(f"⚠️ AI returned debug message instead of function call: {reply}")
-                reply = "מעבד את הבקשה..."
-            
-            reply_to_user = reply
-            reply_for_history = reply
-        
-        # Note: User message saved in admin.py before calling this function
-        # Assistant message will be saved in admin.py after getting the response
-        logger.info(f"   AI Step 11: ✅ AI Service COMPLETE, returning clean reply to user (length: {len(reply_to_user)})")
         return reply_to_user
         
     except Exception as e:
-        logger.error(f"   AI ERROR: 🧪 Sandbox AI error at some step: {type(e).__name__}: {str(e)}", exc_info=True)
-        return "מצטער, הייתה בעיה. נסה שוב"
+        logger.error(f"AI error: {e}", exc_info=True)
+        reply = "מצטער, הייתה בעיה. נסה שוב"
+        await send_whatsapp_message(phone_number, reply)
+        return reply
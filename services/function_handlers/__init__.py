@@ -1,14 +1,45 @@
 """Function handlers for AI function calls"""
+import asyncio
 import logging
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import uuid
+from functools import lru_cache
 from datetime import timedelta
+from utils import get_israel_now
 from utils.timezone_utils import israel_now_isoformat
+from config import DAY_TRANSLATION, TEST_USERS, HELP_MESSAGE
+from services import matching_service
+from services.matching_service import (
+    _calculate_time_tolerance,
+    find_matches_for_new_record,
+    load_match_candidates,
+    send_match_notifications
+)
+from services.route_service import (
+    geocode_address,
+    calculate_distance_between_points,
+    calculate_and_save_route_background
+)
 
 logger = logging.getLogger(__name__)
 
+# Save confirmation templates (filled with str.format_map per save)
+RETURN_TRIP_SAVED_TEMPLATE = (
+    "נסיעה הלוך-שוב נשמרה! 🚗\n"
+    "הלוך: מ{origin} ל{destination} בשעה {departure_time}\n"
+    "חזור: מ{destination} ל{origin} בשעה {return_time}"
+)
+RECORD_SAVED_TEMPLATES = {
+    "driver_recurring": "מעולה! הטרמפ הקבוע שלך ל{destination} נשמר 🚗",
+    "driver": "מעולה! הטרמפ שלך ל{destination} נשמר 🚗",
+    "hitchhiker": "הבקשה שלך ל{destination} נשמרה! 🎒",
+}
+
+# Quote characters stripped from location names (removed in a single translate pass)
+_LOCATION_QUOTES_TABLE = str.maketrans("", "", "\"'")
+
 def _normalize_location(value: str) -> str:
-    return value.strip().lower().replace('"', "").replace("'", "")
+    return value.strip().lower().translate(_LOCATION_QUOTES_TABLE)
 
 def _is_gvaram_location(value: str) -> bool:
     if not value:
@@ -17,7 +48,6 @@ def _is_gvaram_location(value: str) -> bool:
     return "גברעם" in normalized or "gvaram" in normalized
 
 def _infer_travel_date_from_time(time_str: str) -> str:
-    from utils import get_israel_now
     try:
         hours, minutes = map(int, time_str.split(":"))
     except Exception:
@@ -38,6 +68,36 @@ def _round_flex_minutes(minutes: int) -> str:
     rounded = max(10, int(round(minutes / 10)) * 10)
     return f"{rounded} דק'"
 
+@lru_cache(maxsize=256)
+def _format_flexibility_label(origin: str, destination: str, flexibility_level: str) -> Tuple[str, str]:
+    """
+    Get (emoji, text) describing a hitchhiker's time flexibility.
+    Memoized because the label depends only on the route and level,
+    while computing it requires geocoding both ends.
+    """
+    if flexibility_level == "strict":
+        return "🔒", "זמן קבוע, ±30 דק'"
+    if flexibility_level == "very_flexible":
+        return "🟢", "מאוד גמיש, ±6 ש'"
+    
+    # flexible - show actual time tolerance
+    origin_coords = geocode_address(origin)
+    dest_coords = geocode_address(destination)
+    
+    if origin_coords and dest_coords:
+        distance_km = calculate_distance_between_points(origin_coords, dest_coords)
+        tolerance_minutes = _calculate_time_tolerance(flexibility_level, distance_km)
+        return "🟡", f"גמיש, ±{_round_flex_minutes(tolerance_minutes)}"
+    
+    # Fallback if geocoding fails
+    return "🟡", "גמיש"
+
+def _format_record_line(index: int, record: Dict, details: str) -> str:
+    """Format a single numbered record line: "1) מX לY - <details>" """
+    origin = record.get("origin", "גברעם")
+    destination = record.get("destination", "")
+    return f"{index}) מ{origin} ל{destination} - {details}"
+
 def _format_user_records_list(driver_rides: List[Dict], hitchhiker_requests: List[Dict]) -> str:
     """
     Format complete list of user's records with clear numbers
@@ -49,92 +109,39 @@ def _format_user_records_list(driver_rides: List[Dict], hitchhiker_requests: Lis
     Returns:
         Formatted string with numbered list
     """
-    # Day translation map
-    DAY_TRANSLATION = {
-        "Sunday": "א'",
-        "Monday": "ב'",
-        "Tuesday": "ג'",
-        "Wednesday": "ד'",
-        "Thursday": "ה'",
-        "Friday": "ו'",
-        "Saturday": "ש'"
-    }
-    
-    if not driver_rides and not hitchhiker_requests:
-        return ""
-    
-    msg = ""
-    
-    # 🔄 Reverse lists so newest items appear first
-    driver_rides_reversed = list(reversed(driver_rides))
-    hitchhiker_requests_reversed = list(reversed(hitchhiker_requests))
+    sections = []
     
+    # 🔄 Iterate in reverse so newest items appear first
     if driver_rides:
-        msg += "🚗 אני נוסע:\n"
-        for i, ride in enumerate(driver_rides_reversed, 1):
-            origin = ride.get("origin", "גברעם")
-            destination = ride.get("destination", "")
-            
+        lines = ["🚗 אני נוסע:"]
+        for i, ride in enumerate(reversed(driver_rides), 1):
             if ride.get("days"):
                 # Translate days to Hebrew
-                hebrew_days = [DAY_TRANSLATION.get(d, d) for d in ride.get("days", [])]
-                days = ", ".join(hebrew_days)
+                days = ", ".join(DAY_TRANSLATION.get(d, d) for d in ride["days"])
                 time_info = f"ימים: {days}"
             elif ride.get("travel_date"):
                 time_info = f"תאריך: {ride['travel_date']}"
             else:
                 time_info = ""
             
-            msg += f"{i}) מ{origin} ל{destination} - {time_info} בשעה {ride['departure_time']}\n"
+            lines.append(_format_record_line(i, ride, f"{time_info} בשעה {ride['departure_time']}"))
+        sections.append("\n".join(lines))
     
     if hitchhiker_requests:
-        if msg:
-            msg += "\n"
-        msg += "🎒 צריך/ה טרמפ:\n"
-        
-        # Import functions for flexibility calculation
-        from services.route_service import geocode_address, calculate_distance_between_points
-        from services.matching_service import _calculate_time_tolerance
-        
-        for i, req in enumerate(hitchhiker_requests_reversed, 1):
-            origin = req.get("origin", "גברעם")
-            destination = req.get("destination", "")
-            flexibility_level = req.get("flexibility", "flexible")
-            
-            # Calculate actual time tolerance
-            origin_coords = geocode_address(origin)
-            dest_coords = geocode_address(destination)
-            
-            if origin_coords and dest_coords:
-                distance_km = calculate_distance_between_points(origin_coords, dest_coords)
-                tolerance_minutes = _calculate_time_tolerance(flexibility_level, distance_km)
-                
-                # Format flexibility text with emoji
-                if flexibility_level == "strict":
-                    flex_emoji = "🔒"
-                    flex_text = "זמן קבוע, ±30 דק'"
-                elif flexibility_level == "very_flexible":
-                    flex_emoji = "🟢"
-                    flex_text = "מאוד גמיש, ±6 ש'"
-                else:  # flexible
-                    flex_emoji = "🟡"
-                    flex_text = f"גמיש, ±{_round_flex_minutes(tolerance_minutes)}"
-            else:
-                # Fallback if geocoding fails
-                if flexibility_level == "strict":
-                    flex_emoji = "🔒"
-                    flex_text = "זמן קבוע, ±30 דק'"
-                elif flexibility_level == "very_flexible":
-                    flex_emoji = "🟢"
-                    flex_text = "מאוד גמיש, ±6 ש'"
-                else:
-                    flex_emoji = "🟡"
-                    flex_text = "גמיש"
+        lines = ["🎒 צריך/ה טרמפ:"]
+        for i, req in enumerate(reversed(hitchhiker_requests), 1):
+            flex_emoji, flex_text = _format_flexibility_label(
+                req.get("origin", "גברעם"),
+                req.get("destination", ""),
+                req.get("flexibility", "flexible")
+            )
             
             travel_date = req.get("travel_date") or "ללא תאריך"
-            msg += f"{i}) מ{origin} ל{destination} - {travel_date} בשעה {req['departure_time']} {flex_emoji} ({flex_text})\n"
+            lines.append(_format_record_line(i, req, f"{travel_date} בשעה {req['departure_time']} {flex_emoji} ({flex_text})"))
+        sections.append("\n".join(lines))
     
-    return msg.strip()
+    # Sections are separated by a blank line (empty string when there are no records)
+    return "\n\n".join(sections)
 
 def find_conflict(user_data: dict, role: str, destination: str, travel_date: str) -> dict:
     """
@@ -153,12 +160,16 @@ def find_conflict(user_data: dict, role: str, destination: str, travel_date: str
     opposite_key = "hitchhiker_requests" if opposite_role == "hitchhiker" else "driver_rides"
     
     records = user_data.get(opposite_key, [])
+    destination_lower = destination.lower()
     for idx, record in enumerate(records):
-        record_dest = record.get("destination", "").strip()
         record_date = record.get("travel_date", "")
+        if record_date != travel_date:
+            continue
+        
+        record_dest = record.get("destination", "").strip()
         
         # Normalize destinations for comparison
-        if record_dest.lower() == destination.lower() and record_date == travel_date:
+        if record_dest.lower() == destination_lower:
             return {
                 "role": opposite_role,
                 "record_number": idx + 1,
@@ -172,28 +183,11 @@ def find_conflict(user_data: dict, role: str, destination: str, travel_date: str
 async def handle_update_user_records(phone_number: str, arguments: Dict, collection_prefix: str = "", send_whatsapp: bool = True) -> Dict:
     """Handle update_user_records function call"""
     from database import add_user_ride_or_request, get_user_rides_and_requests
-    from services.matching_service import find_matches_for_new_record, send_match_notifications
-    
-    # Get user name (from the sandbox user data if in sandbox mode)
-    if collection_prefix:
-        # Sandbox mode - get from test collection
-        user_data = await get_user_rides_and_requests(phone_number, collection_prefix)
-        # Try to get name from first query, or use default
-        from database import get_db
-        db = get_db()
-        if db:
-            doc = db.collection(f"{collection_prefix}users").document(phone_number).get()
-            if doc.exists:
-                user_name = doc.to_dict().get("name", "משתמש")
-            else:
-                user_name = "משתמש"
-        else:
-            user_name = "משתמש"
-    else:
-        # Production mode - use regular function
-        from database import get_or_create_user
-        user_data, _ = await get_or_create_user(phone_number)
-        user_name = user_data.get("name", "משתמש")
+    
+    # One read gives both the user's name and the active records used for conflict checks
+    # (add_user_ride_or_request creates the user if it doesn't exist yet)
+    user_data = await get_user_rides_and_requests(phone_number, collection_prefix)
+    user_name = user_data.get("name") or "משתמש"
     
     role = arguments.get("role")
     origin = arguments.get("origin", "גברעם")  # Default to גברעם
@@ -244,6 +238,8 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
                 f"{departure_time}|{conflict['record_number']}"
             )
     
+    created_at = israel_now_isoformat()  # Shared by the outbound and return records
+    
     def build_record(origin_val, destination_val, departure_time_val):
         """Helper function to build a record"""
         record = {
@@ -252,7 +248,7 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
             "destination": destination_val,
             "name": user_name,
             "active": True,
-            "created_at": israel_now_isoformat(),
+            "created_at": created_at,
         }
         
         if role == "driver":
@@ -288,7 +284,6 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
             
             # 🗺️ Geocode origin and destination for map display
             try:
-                from services.route_service import geocode_address
                 origin_coords = geocode_address(origin_val)
                 dest_coords = geocode_address(destination_val)
                 
@@ -333,9 +328,6 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
         
         # 🆕 Start background route calculations (fire-and-forget)
         if role == "driver":
-            import asyncio
-            from services.route_service import calculate_and_save_route_background
-            
             asyncio.create_task(calculate_and_save_route_background(
                 phone_number,
                 outbound_record["id"],
@@ -357,27 +349,30 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
         outbound_record["phone_number"] = phone_number
         return_record["phone_number"] = phone_number
         
-        # Run matching for BOTH
-        logger.info(f"🔍 Starting match search for outbound trip...")
-        matches_outbound = await find_matches_for_new_record(role, outbound_record, collection_prefix)
-        
-        logger.info(f"🔍 Starting match search for return trip...")
-        matches_return = await find_matches_for_new_record(role, return_record, collection_prefix)
+        # Run matching for BOTH (same role - one users scan shared by both searches, run concurrently)
+        logger.info(f"🔍 Starting match search for outbound and return trips...")
+        candidates = await load_match_candidates(role, collection_prefix)
+        matches_outbound, matches_return = await asyncio.gather(
+            find_matches_for_new_record(role, outbound_record, collection_prefix, candidates),
+            find_matches_for_new_record(role, return_record, collection_prefix, candidates)
+        )
         
         # Build success message (send before notifications)
         total_matches = len(matches_outbound) + len(matches_return)
-        msg = f"נסיעה הלוך-שוב נשמרה! 🚗\n"
-        msg += f"הלוך: מ{origin} ל{destination} בשעה {departure_time}\n"
-        msg += f"חזור: מ{destination} ל{origin} בשעה {return_time}"
+        msg = RETURN_TRIP_SAVED_TEMPLATE.format_map({
+            "origin": origin,
+            "destination": destination,
+            "departure_time": departure_time,
+            "return_time": return_time
+        })
         
         if total_matches > 0:
             msg += f"\n\n🎯 נמצאו {total_matches} התאמות!"
         
-        # Get updated list and append
-        data = await get_user_rides_and_requests(phone_number, collection_prefix)
+        # Append the updated list (returned by the second save - no extra read)
         list_msg = _format_user_records_list(
-            data.get("driver_rides", []),
-            data.get("hitchhiker_requests", [])
+            result2.get("driver_rides", []),
+            result2.get("hitchhiker_requests", [])
         )
         
         if list_msg:
@@ -387,8 +382,6 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
         
         # Send match notifications AFTER the success message (with small delay)
         if matches_outbound or matches_return:
-            import asyncio
-            
             async def send_notifications_delayed():
                 await asyncio.sleep(0.5)  # Small delay to ensure success message is sent first
                 if matches_outbound:
@@ -422,11 +415,10 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
     if not result.get("success"):
         # If duplicate, return friendly message with current list
         if result.get("is_duplicate"):
-            # Get current list
-            data = await get_user_rides_and_requests(phone_number, collection_prefix)
+            # Current list comes back with the duplicate result
             list_msg = _format_user_records_list(
-                data.get("driver_rides", []),
-                data.get("hitchhiker_requests", [])
+                result.get("driver_rides", []),
+                result.get("hitchhiker_requests", [])
             )
             duplicate_msg = result.get("message", "הנסיעה כבר קיימת")
             if list_msg:
@@ -438,9 +430,6 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
     
     # 🆕 Start background route calculation (fire-and-forget)
     if role == "driver":
-        import asyncio
-        from services.route_service import calculate_and_save_route_background
-        
         asyncio.create_task(calculate_and_save_route_background(
             phone_number,
             record["id"],
@@ -467,16 +456,14 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
     
     # Success message (send first, before notifications)
     if role == "driver":
-        if record.get("days"):
-            msg = f"מעולה! הטרמפ הקבוע שלך ל{destination} נשמר 🚗"
-        else:
-            msg = f"מעולה! הטרמפ שלך ל{destination} נשמר 🚗"
+        template_key = "driver_recurring" if record.get("days") else "driver"
+        msg = RECORD_SAVED_TEMPLATES[template_key].format_map({"destination": destination})
         # Don't show hitchhiker matches to driver (policy decision)
         if matches:
             logger.info(f"🔕 Suppressing hitchhiker match count for driver ({len(matches)} matches found)")
     else:
         # Hitchhiker - add flexibility info
-        msg = f"הבקשה שלך ל{destination} נשמרה! 🎒"
+        msg = RECORD_SAVED_TEMPLATES["hitchhiker"].format_map({"destination": destination})
         
         # Calculate and show time flexibility
         flexibility_level = record.get("flexibility", "flexible")
@@ -485,12 +472,10 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
         if matches:
             msg += f"\n🚗 נמצאו {len(matches)} נהגים מתאימים!"
     
-    # Get updated list and append
-    from database import get_user_rides_and_requests
-    data = await get_user_rides_and_requests(phone_number, collection_prefix)
+    # Append the updated list (returned by the save - no extra read)
     list_msg = _format_user_records_list(
-        data.get("driver_rides", []),
-        data.get("hitchhiker_requests", [])
+        result.get("driver_rides", []),
+        result.get("hitchhiker_requests", [])
     )
     
     if list_msg:
@@ -500,24 +485,23 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
     
     # For test users: include match details in the main message
     # ONLY for hitchhikers - drivers should NOT see hitchhiker details
-    from config import TEST_USERS
     is_test_user = phone_number in TEST_USERS
     
     if matches and is_test_user and role == "hitchhiker":
         logger.info(f"📝 Adding {len(matches)} driver details to message (test user, hitchhiker)")
         logger.info(f"   Current message length before adding matches: {len(msg)}")
-        from services import matching_service
-        msg += "\n\n💡 התאמות שנמצאו:"
+        match_parts = [msg, "💡 התאמות שנמצאו:"]
         for i, match in enumerate(matches, 1):
             try:
                 # Show driver details to hitchhiker
                 logger.info(f"   Formatting driver {i}: {match.get('phone_number')} to {match.get('destination')}")
                 match_msg = matching_service._format_driver_message(match)
                 logger.info(f"   Match message length: {len(match_msg)}")
-                msg += f"\n\n{i}. {match_msg}"
+                match_parts.append(f"{i}. {match_msg}")
             except Exception as e:
                 logger.error(f"   ❌ Error formatting match {i}: {type(e).__name__}: {str(e)}", exc_info=True)
-                msg += f"\n\n{i}. שגיאה בפורמט ההתאמה"
+                match_parts.append(f"{i}. שגיאה בפורמט ההתאמה")
+        msg = "\n\n".join(match_parts)
         
         logger.info(f"   ✅ Finished adding matches, final message length: {len(msg)}")
     elif matches and is_test_user and role == "driver":
@@ -527,8 +511,6 @@ async def handle_update_user_records(phone_number: str, arguments: Dict, collect
     # Always send notifications - whatsapp_service will handle test users automatically
     # BUT: For drivers, skip initial notifications - they'll be sent after route calculation
     if matches and send_whatsapp and role != "driver":
-        import asyncio
-        
         async def send_notifications_delayed():
             await asyncio.sleep(0.5)  # Small delay to ensure success message is sent first
             await send_match_notifications(
@@ -614,12 +596,12 @@ async def handle_delete_user_record(phone_number: str, arguments: Dict, collecti
     if not success:
         return {"status": "error", "message": "מחיקה נכשלה"}
     
-    # Get updated list
-    data = await get_user_rides_and_requests(phone_number, collection_prefix)
-    list_msg = _format_user_records_list(
-        data.get("driver_rides", []),
-        data.get("hitchhiker_requests", [])
-    )
+    # Updated list = the list we just read minus the deleted record (no second read)
+    remaining = [r for r in records if r.get("id") != record_id]
+    if role == "driver":
+        list_msg = _format_user_records_list(remaining, data.get("hitchhiker_requests", []))
+    else:
+        list_msg = _format_user_records_list(data.get("driver_rides", []), remaining)
     
     if list_msg:
         return {
@@ -633,7 +615,7 @@ async def handle_delete_user_record(phone_number: str, arguments: Dict, collecti
 
 async def handle_delete_all_user_records(phone_number: str, arguments: Dict, collection_prefix: str = "") -> Dict:
     """Handle delete_all_user_records function call - delete all records of a type or everything"""
-    from database import remove_user_ride_or_request, get_user_rides_and_requests
+    from database import remove_user_rides_or_requests, get_user_rides_and_requests
     
     role = arguments.get("role")
     
@@ -651,28 +633,37 @@ async def handle_delete_all_user_records(phone_number: str, arguments: Dict, col
         if not driver_records and not hitchhiker_records:
             return {"status": "success", "message": "אין לך נסיעות למחוק"}
         
-        # Delete all driver rides
-        deleted_drivers = 0
-        for record in driver_records:
-            record_id = record.get("id")
-            if record_id:
-                success = await remove_user_ride_or_request(phone_number, "driver", record_id, collection_prefix)
-                if success:
-                    deleted_drivers += 1
+        # Delete all driver rides and hitchhiker requests (one read + one write)
+        ids_by_role = {
+            "driver": [record.get("id") for record in driver_records if record.get("id")],
+            "hitchhiker": [record.get("id") for record in hitchhiker_records if record.get("id")]
+        }
+        removed = await remove_user_rides_or_requests(phone_number, ids_by_role, collection_prefix)
+        deleted_drivers = removed.get("driver", 0)
+        deleted_hitchhikers = removed.get("hitchhiker", 0)
+        total_ids = len(ids_by_role["driver"]) + len(ids_by_role["hitchhiker"])
+        
+        if total_ids and deleted_drivers + deleted_hitchhikers == 0:
+            return {"status": "error", "message": "מחיקה נכשלה"}
+        
+        deleted_msg = f"כל הנסיעות נמחקו בהצלחה! ✅\n🚗 {deleted_drivers} טרמפים נמחקו\n🎒 {deleted_hitchhikers} בקשות נמחקו"
         
-        # Delete all hitchhiker requests
-        deleted_hitchhikers = 0
-        for record in hitchhiker_records:
-            record_id = record.get("id")
-            if record_id:
-                success = await remove_user_ride_or_request(phone_number, "hitchhiker", record_id, collection_prefix)
-                if success:
-                    deleted_hitchhikers += 1
+        if deleted_drivers + deleted_hitchhikers < total_ids:
+            # Some deletes didn't go through - show the real state, not what we expected
+            data = await get_user_rides_and_requests(phone_number, collection_prefix)
+            list_msg = _format_user_records_list(
+                data.get("driver_rides", []),
+                data.get("hitchhiker_requests", [])
+            )
+            if list_msg:
+                return {
+                    "status": "success",
+                    "message": f"{deleted_msg}\n\n📋 הנסיעות שלך עכשיו:\n\n{list_msg}"
+                }
         
-        total_deleted = deleted_drivers + deleted_hitchhikers
         return {
             "status": "success",
-            "message": f"כל הנסיעות נמחקו בהצלחה! ✅\n🚗 {deleted_drivers} טרמפים נמחקו\n🎒 {deleted_hitchhikers} בקשות נמחקו\n\nאין נסיעות פעילות"
+            "message": f"{deleted_msg}\n\nאין נסיעות פעילות"
         }
     
     # Handle specific role
@@ -686,21 +677,28 @@ async def handle_delete_all_user_records(phone_number: str, arguments: Dict, col
     if not records:
         return {"status": "success", "message": f"אין לך {record_type} למחוק"}
     
-    # Delete all records
-    deleted_count = 0
-    for record in records:
-        record_id = record.get("id")
-        if record_id:
-            success = await remove_user_ride_or_request(phone_number, role, record_id, collection_prefix)
-            if success:
-                deleted_count += 1
+    # Delete all records (one read + one write for the whole list)
+    record_ids = [record.get("id") for record in records if record.get("id")]
+    removed = await remove_user_rides_or_requests(phone_number, {role: record_ids}, collection_prefix)
+    deleted_count = removed.get(role, 0)
     
-    # Get updated list
-    data = await get_user_rides_and_requests(phone_number, collection_prefix)
-    list_msg = _format_user_records_list(
-        data.get("driver_rides", []),
-        data.get("hitchhiker_requests", [])
-    )
+    if record_ids and deleted_count == 0:
+        return {"status": "error", "message": "מחיקה נכשלה"}
+    
+    if deleted_count < len(record_ids):
+        # Some deletes didn't go through - show the real state, not what we expected
+        data = await get_user_rides_and_requests(phone_number, collection_prefix)
+        list_msg = _format_user_records_list(
+            data.get("driver_rides", []),
+            data.get("hitchhiker_requests", [])
+        )
+    else:
+        # Updated list = the other role's records (plus any id-less ones we couldn't delete) - no second read
+        remaining = [record for record in records if not record.get("id")]
+        if role == "driver":
+            list_msg = _format_user_records_list(remaining, data.get("hitchhiker_requests", []))
+        else:
+            list_msg = _format_user_records_list(data.get("driver_rides", []), remaining)
     
     if not list_msg:
         return {
@@ -716,7 +714,6 @@ async def handle_delete_all_user_records(phone_number: str, arguments: Dict, col
 async def handle_update_user_record(phone_number: str, arguments: Dict, collection_prefix: str = "", send_whatsapp: bool = True) -> Dict:
     """Handle update_user_record function call - update existing ride/request"""
     from database import get_user_rides_and_requests, update_user_ride_or_request
-    from services.matching_service import find_matches_for_new_record, send_match_notifications
     
     record_number = arguments.get("record_number")
     role = arguments.get("role")
@@ -821,9 +818,6 @@ async def handle_update_user_record(phone_number: str, arguments: Dict, collecti
     
     # 🆕 Recalculate route in background if origin/destination changed
     if needs_route_recalc and role == "driver":
-        import asyncio
-        from services.route_service import calculate_and_save_route_background
-        
         asyncio.create_task(calculate_and_save_route_background(
             phone_number,
             record_id,
@@ -850,17 +844,9 @@ async def handle_update_user_record(phone_number: str, arguments: Dict, collecti
         # Inform user that search was performed but no matches found
         msg += "\n\n🔍 חיפשתי התאמות אבל לא נמצאו כרגע"
     
-    # Get updated list
-    data = await get_user_rides_and_requests(phone_number, collection_prefix)
-    
+    # Updated list - reuse the post-update read (matching doesn't change the user's records)
     # DEBUG: Log the updated record to verify it was actually updated
-    if role == "driver":
-        rides = data.get("driver_rides", [])
-        if record_number <= len(rides):
-            actual_record = rides[record_number - 1]
-            logger.info(f"🔍 DEBUG update_user_record: Record {record_number} after update: {actual_record.get('destination')} at {actual_record.get('departure_time')}")
-        else:
-            logger.warning(f"⚠️ DEBUG: record_number {record_number} > len(rides) {len(rides)}")
+    logger.info(f"🔍 DEBUG update_user_record: Record {record_number} after update: {updated_record.get('destination')} at {updated_record.get('departure_time')}")
     
     list_msg = _format_user_records_list(
         data.get("driver_rides", []),
@@ -875,8 +861,6 @@ async def handle_update_user_record(phone_number: str, arguments: Dict, collecti
     # Send match notifications AFTER the success message (with small delay)
     # BUT: For drivers with route recalc pending, skip - notifications will be sent after route calculation
     if matches and not (needs_route_recalc and role == "driver"):
-        import asyncio
-        
         async def send_notifications_delayed():
             await asyncio.sleep(0.5)  # Small delay to ensure success message is sent first
             await send_match_notifications(
@@ -901,7 +885,6 @@ async def handle_show_help(phone_number: str, collection_prefix: str = "") -> Di
     Otherwise, show help message.
     """
     from database import get_user_rides_and_requests
-    from config import HELP_MESSAGE
     
     # Get user's current trips
     data = await get_user_rides_and_requests(phone_number, collection_prefix)
@@ -1,18 +1,79 @@
 """Matching engine for drivers and hitchhikers"""
+import asyncio
 import logging
-from typing import List, Dict
+import unicodedata
+from typing import List, Dict, Optional, NamedTuple
 from datetime import datetime
+from functools import lru_cache
 from rapidfuzz import fuzz
+from config import DAY_TRANSLATION
+from services.route_service import (
+    geocode_address,
+    get_route_data,
+    calculate_min_distance_to_route,
+    calculate_dynamic_threshold,
+    calculate_distance_between_points
+)
 
 logger = logging.getLogger(__name__)
 
+# Flexibility level -> Hebrew display text
+FLEXIBILITY_HEBREW = {
+    "strict": "זמן קבוע ⏰",
+    "flexible": "גמיש 🟡",
+    "very_flexible": "מאוד גמיש 🟢"
+}
+
+# Match notification templates (filled with str.format per notification)
+DRIVER_MATCH_TEMPLATE = (
+    "🚗 נמצא נהג!\n\n"
+    "{name} נוסע ל{destination}\n"
+    "{time_info}\n"
+    "שעה: {departure_time}{route_note}\n\n"
+    "📱 טלפון: +{phone_number}\n\n"
+    "בהצלחה! 🙂"
+)
+DRIVER_ROUTE_NOTE = "\n\n📍 היעד שלך נמצא בדרך ({distance:.1f} ק\"מ מהמסלול)"
+
+HITCHHIKER_MATCH_TEMPLATE = (
+    "🎒 נמצא טרמפיסט!\n\n"
+    "{name} מחפש/ת נסיעה ל{destination}\n"
+    "תאריך: {travel_date}\n"
+    "שעה: {departure_time}\n"
+    "גמישות: {flexibility}{route_note}\n\n"
+    "📱 טלפון: +{phone_number}\n\n"
+    "בהצלחה! 🙂"
+)
+HITCHHIKER_ROUTE_NOTE = "\n\n📍 היעד שלו/ה בדרך אליך ({distance:.1f} ק\"מ מהמסלול שלך)"
+
+# Max WhatsApp notifications in flight at once when notifying several users
+MAX_CONCURRENT_NOTIFICATIONS = 8
+
+# WhatsApp text body limit - several match notifications are combined up to this size
+WHATSAPP_MAX_MESSAGE_LENGTH = 4096
+
+
+class CompatibilityResult(NamedTuple):
+    """Result of a destination compatibility check"""
+    is_match: bool
+    match_type: Optional[str] = None
+    details: Optional[Dict] = None
+
+
+# Marks a lazily computed value that hasn't been resolved yet (None is a valid result)
+_NOT_RESOLVED = object()
+
+# Shared result for every failed compatibility check
+NO_MATCH = CompatibilityResult(False)
+EXACT_MATCH = CompatibilityResult(True, "exact_match")
+
 async def _log_matches(
     role: str,
     matches: List[Dict],
     new_record: Dict,
     collection_prefix: str = ""
 ) -> None:
-    from database import get_db
+    from database import get_db, MAX_BATCH_WRITES
     from utils.timezone_utils import israel_now_isoformat
 
     db = get_db()
@@ -23,13 +84,16 @@ async def _log_matches(
     matcher_role = role
     matched_role = "hitchhiker" if role == "driver" else "driver"
     environment = collection_prefix or "production"
+    matches_collection = db.collection("matches")
+    timestamp = israel_now_isoformat()  # One timestamp for the whole match run
+    records = []
 
     for match in matches:
         match_details = match.get("_match_details")
         match_kind = "on_route" if match_details else "exact_match"
 
         record = {
-            "timestamp": israel_now_isoformat(),
+            "timestamp": timestamp,
             "match_type": matcher_role,
             "match_kind": match_kind,
             "environment": environment,
@@ -52,14 +116,44 @@ async def _log_matches(
             "source_ride_id": new_record.get("id"),
             "matched_ride_id": match.get("ride_id") or match.get("request_id"),
         }
+        records.append(record)
 
+    # Write all match records in batched commits instead of one round-trip per match
+    for start in range(0, len(records), MAX_BATCH_WRITES):
+        chunk = records[start:start + MAX_BATCH_WRITES]
         try:
-            db.collection("matches").add(record)
+            batch = db.batch()
+            for record in chunk:
+                batch.set(matches_collection.document(), record)
+            batch.commit()
         except Exception as e:
-            logger.error(f"❌ Failed to log match: {e}")
+            logger.error(f"❌ Failed to log {len(chunk)} matches: {e}")
 
-async def find_matches_for_new_record(role: str, record_data: Dict, collection_prefix: str = "") -> List[Dict]:
-    """Main matching function - called after every update"""
+async def load_match_candidates(role: str, collection_prefix: str = "") -> List[Dict]:
+    """
+    Scan the opposite side's records for a new record of the given role
+    (lets several records with the same role - e.g. a return trip - share one users scan)
+    """
+    from database import get_drivers_by_route, get_hitchhiker_requests
+    
+    if role == "driver":
+        return await get_hitchhiker_requests(collection_prefix=collection_prefix)
+    if role == "hitchhiker":
+        return await get_drivers_by_route(collection_prefix=collection_prefix)
+    return []
+
+async def find_matches_for_new_record(
+    role: str,
+    record_data: Dict,
+    collection_prefix: str = "",
+    candidates: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """
+    Main matching function - called after every update
+    
+    Args:
+        candidates: Pre-loaded result of load_match_candidates (skips the users scan)
+    """
     try:
         logger.info(f"🔍 find_matches_for_new_record called:")
         logger.info(f"   Role: {role}")
@@ -68,12 +162,17 @@ async def find_matches_for_new_record(role: str, record_data: Dict, collection_p
         logger.info(f"   Time: {record_data.get('departure_time')}")
         logger.info(f"   Collection: {collection_prefix or 'production'}")
         
+        # Nothing can match without a destination or time - skip the full users scan
+        if not record_data.get("destination") or not record_data.get("departure_time"):
+            logger.warning(f"⚠️ Record missing destination or departure_time, skipping matching")
+            return []
+        
         if role == "driver":
-            result = await find_hitchhikers_for_driver(record_data, collection_prefix)
+            result = await find_hitchhikers_for_driver(record_data, collection_prefix, candidates)
             logger.info(f"✅ find_hitchhikers_for_driver returned {len(result)} matches")
             return result
         elif role == "hitchhiker":
-            result = await find_drivers_for_hitchhiker(record_data, collection_prefix)
+            result = await find_drivers_for_hitchhiker(record_data, collection_prefix, candidates)
             logger.info(f"✅ find_drivers_for_hitchhiker returned {len(result)} matches")
             return result
         
@@ -83,7 +182,11 @@ async def find_matches_for_new_record(role: str, record_data: Dict, collection_p
         logger.error(f"❌ Exception in find_matches_for_new_record: {e}", exc_info=True)
         return []
 
-async def find_drivers_for_hitchhiker(hitchhiker: Dict, collection_prefix: str = "") -> List[Dict]:
+async def find_drivers_for_hitchhiker(
+    hitchhiker: Dict,
+    collection_prefix: str = "",
+    candidates: Optional[List[Dict]] = None
+) -> List[Dict]:
     """Hitchhiker looking for ride → search drivers"""
     from database import get_drivers_by_route
     
@@ -97,79 +200,88 @@ async def find_drivers_for_hitchhiker(hitchhiker: Dict, collection_prefix: str =
         logger.warning(f"⚠️ Hitchhiker missing travel_date: {hitchhiker}")
         return []
     
-    drivers = await get_drivers_by_route(destination=dest, collection_prefix=collection_prefix)
+    if candidates is not None:
+        # Shared scan - copy so match details stored below stay per search
+        drivers = [dict(candidate) for candidate in candidates]
+    else:
+        drivers = await get_drivers_by_route(destination=dest, collection_prefix=collection_prefix)
     logger.info(f"📊 Found {len(drivers)} potential drivers")
     matches = []
     
-    day_name = datetime.strptime(date, "%Y-%m-%d").strftime("%A")
+    day_name = _weekday_name(date)
     
-    for driver in drivers:
-        logger.info(f"  🚗 Checking driver: {driver.get('name', 'Unknown')} to {driver['destination']}")
-        
-        # 🆕 Check destination compatibility (direct or on-route)
-        is_match, match_type, details = await _check_destination_compatibility(
-            driver.get("origin", "גברעם"),
-            driver["destination"],
-            dest,
-            driver
-        )
-        
-        if not is_match:
-            logger.info(f"    ❌ Destination incompatible")
-            continue
+    # 🆕 Calculate dynamic time tolerance based on distance and flexibility
+    # (depends only on the hitchhiker - computed once, not per driver)
+    origin_coords = geocode_address(hitchhiker.get("origin", "גברעם"))
+    hh_dest_coords = geocode_address(dest)
+    
+    if origin_coords and hh_dest_coords:
+        distance_km = calculate_distance_between_points(origin_coords, hh_dest_coords)
+        flexibility_level = hitchhiker.get("flexibility", "flexible")
+        tolerance = _calculate_time_tolerance(flexibility_level, distance_km)
         
-        logger.info(f"    ✅ Destination match ({match_type})")
-        if details:
-            driver["_match_details"] = details  # Store for notification
+        logger.info("📏 Distance: %.1fkm, Flexibility: %s → ±%s min", distance_km, flexibility_level, tolerance)
+    else:
+        tolerance = 30  # Fallback to default
+        logger.info("⚠️ Failed to calculate distance, using default tolerance: ±%s min", tolerance)
+    
+    for driver in drivers:
+        logger.info("  🚗 Checking driver: %s to %s", driver.get('name', 'Unknown'), driver['destination'])
         
         # Check if driver matches - either recurring (days) or one-time (travel_date)
+        # (cheap schedule check first - skips route/geocoding work for drivers on other days)
         if driver.get("days"):
             # Recurring driver - check if day matches
-            logger.info(f"    📅 Recurring driver, checking day: {day_name} in {driver.get('days')}")
+            logger.info("    📅 Recurring driver, checking day: %s in %s", day_name, driver.get('days'))
             if day_name not in driver.get("days", []):
-                logger.info(f"    ❌ Day not in driver's schedule")
+                logger.info("    ❌ Day not in driver's schedule")
                 continue
         elif driver.get("travel_date"):
             # One-time driver - check if date matches
-            logger.info(f"    📅 One-time driver, checking date: {date} vs {driver.get('travel_date')}")
+            logger.info("    📅 One-time driver, checking date: %s vs %s", date, driver.get('travel_date'))
             if driver.get("travel_date") != date:
-                logger.info(f"    ❌ Date mismatch")
+                logger.info("    ❌ Date mismatch")
                 continue
         else:
             # No days or date - skip
-            logger.info(f"    ❌ Driver has no days or travel_date")
+            logger.info("    ❌ Driver has no days or travel_date")
             continue
         
-        # 🆕 Calculate dynamic time tolerance based on distance and flexibility
-        from services.route_service import geocode_address, calculate_distance_between_points
-        
-        origin_coords = geocode_address(hitchhiker.get("origin", "גברעם"))
-        hh_dest_coords = geocode_address(hitchhiker["destination"])
-        
-        if origin_coords and hh_dest_coords:
-            distance_km = calculate_distance_between_points(origin_coords, hh_dest_coords)
-            flexibility_level = hitchhiker.get("flexibility", "flexible")
-            tolerance = _calculate_time_tolerance(flexibility_level, distance_km)
-            
-            logger.info(f"    📏 Distance: {distance_km:.1f}km, Flexibility: {flexibility_level} → ±{tolerance} min")
-        else:
-            tolerance = 30  # Fallback to default
-            logger.info(f"    ⚠️ Failed to calculate distance, using default tolerance: ±{tolerance} min")
-        
+        # Time and approval are plain comparisons - check them before the route work
         if not _match_time(time, driver["departure_time"], tolerance):
-            logger.info(f"    ❌ Time mismatch: {time} vs {driver['departure_time']} (tolerance: ±{tolerance} min)")
+            logger.info("    ❌ Time mismatch: %s vs %s (tolerance: ±%s min)", time, driver['departure_time'], tolerance)
             continue
         if not driver.get("auto_approve_matches", True):
-            logger.info(f"    ❌ Driver doesn't auto-approve")
+            logger.info("    ❌ Driver doesn't auto-approve")
+            continue
+        
+        # 🆕 Check destination compatibility (direct or on-route)
+        is_match, match_type, details = await _check_destination_compatibility(
+            driver.get("origin", "גברעם"),
+            driver["destination"],
+            dest,
+            driver
+        )
+        
+        if not is_match:
+            logger.info("    ❌ Destination incompatible")
             continue
         
-        logger.info(f"    ✅ MATCH FOUND!")
+        logger.info("    ✅ Destination match (%s)", match_type)
+        if details:
+            driver["_match_details"] = details  # Store for notification
+        
+        logger.info("    ✅ MATCH FOUND!")
         matches.append(driver)
     
     logger.info(f"Found {len(matches)} drivers for hitchhiker")
     return matches
 
-async def find_hitchhikers_for_driver(driver: Dict, collection_prefix: str = "") -> List[Dict]:
+async def find_hitchhikers_for_driver(
+    driver: Dict,
+    collection_prefix: str = "",
+    candidates: Optional[List[Dict]] = None
+) -> List[Dict]:
     """Driver offers ride → search hitchhikers"""
     from database import get_hitchhiker_requests
     
@@ -178,57 +290,62 @@ async def find_hitchhikers_for_driver(driver: Dict, collection_prefix: str = "")
     
     logger.info(f"🔍 Looking for hitchhikers: dest={dest}, days={driver.get('days')}, date={driver.get('travel_date')}, time={time}, collection={collection_prefix or 'production'}")
     
-    hitchhikers = await get_hitchhiker_requests(destination=dest, collection_prefix=collection_prefix)
+    if candidates is not None:
+        # Shared scan - copy so match details stored below stay per search.
+        # The scan was unfiltered, so apply get_hitchhiker_requests' legacy
+        # destination filter here (legacy records are substring-matched by destination)
+        dest_lower = dest.lower()
+        hitchhikers = [
+            dict(candidate) for candidate in candidates
+            if candidate.get("request_id") != "legacy"
+            or dest_lower in (candidate.get("destination") or "").lower()
+        ]
+    else:
+        hitchhikers = await get_hitchhiker_requests(destination=dest, collection_prefix=collection_prefix)
     logger.info(f"📊 Found {len(hitchhikers)} potential hitchhikers")
     matches = []
     
+    # Same driver for every candidate - decode the stored route once
+    driver_route_coords = _load_route_coords(driver)
+    # ...and build the set of driver's days once (O(1) day lookups per hitchhiker)
+    driver_days = frozenset(driver.get("days") or ())
+    # Many hitchhikers ask for the same destination - check each one against the route once
+    compatibility_by_destination: Dict[str, CompatibilityResult] = {}
+    # Driver's origin is the same for every candidate - geocode it once, on first use
+    # (only candidates that pass the schedule check need it)
+    driver_origin = driver.get("origin", "גברעם")
+    origin_coords = _NOT_RESOLVED
+    
     for hitchhiker in hitchhikers:
-        logger.info(f"  🎒 Checking hitchhiker to {hitchhiker['destination']}")
-        
-        # 🆕 Check destination compatibility (direct or on-route)
-        is_match, match_type, details = await _check_destination_compatibility(
-            driver.get("origin", "גברעם"),
-            dest,
-            hitchhiker["destination"],
-            driver
-        )
-        
-        if not is_match:
-            logger.info(f"    ❌ Destination incompatible")
-            continue
+        logger.info("  🎒 Checking hitchhiker to %s", hitchhiker['destination'])
         
-        logger.info(f"    ✅ Destination match ({match_type})")
-        if details:
-            hitchhiker["_match_details"] = details  # Store for notification
-        
-        # Check date/day match
+        # Check date/day and time first - plain comparisons, no route work
         request_date = hitchhiker.get("travel_date")
         if not request_date:
-            logger.info(f"    ❌ Hitchhiker missing travel_date")
+            logger.info("    ❌ Hitchhiker missing travel_date")
             continue
         
-        if driver.get("days"):
+        if driver_days:
             # Recurring driver - check if hitchhiker's date falls on driver's days
-            day_name = datetime.strptime(request_date, "%Y-%m-%d").strftime("%A")
-            logger.info(f"    📅 Recurring driver, checking day: {day_name} in {driver.get('days')}")
-            if day_name not in driver.get("days", []):
-                logger.info(f"    ❌ Day not in driver's schedule")
+            day_name = _weekday_name(request_date)
+            logger.info("    📅 Recurring driver, checking day: %s in %s", day_name, driver.get('days'))
+            if day_name not in driver_days:
+                logger.info("    ❌ Day not in driver's schedule")
                 continue
         elif driver.get("travel_date"):
             # One-time driver - check if dates match exactly
-            logger.info(f"    📅 One-time driver, checking dates: {driver.get('travel_date')} vs {request_date}")
+            logger.info("    📅 One-time driver, checking dates: %s vs %s", driver.get('travel_date'), request_date)
             if driver.get("travel_date") != request_date:
-                logger.info(f"    ❌ Date mismatch")
+                logger.info("    ❌ Date mismatch")
                 continue
         else:
             # No days or date - skip
-            logger.info(f"    ❌ Driver has no days or travel_date")
+            logger.info("    ❌ Driver has no days or travel_date")
             continue
         
         # 🆕 Calculate dynamic time tolerance based on distance and flexibility
-        from services.route_service import geocode_address, calculate_distance_between_points
-        
-        origin_coords = geocode_address(driver.get("origin", "גברעם"))
+        if origin_coords is _NOT_RESOLVED:
+            origin_coords = geocode_address(driver_origin)
         hh_dest_coords = geocode_address(hitchhiker["destination"])
         
         if origin_coords and hh_dest_coords:
@@ -236,16 +353,38 @@ async def find_hitchhikers_for_driver(driver: Dict, collection_prefix: str = "")
             flexibility_level = hitchhiker.get("flexibility", "flexible")
             tolerance = _calculate_time_tolerance(flexibility_level, distance_km)
             
-            logger.info(f"    📏 Distance: {distance_km:.1f}km, Flexibility: {flexibility_level} → ±{tolerance} min")
+            logger.info("    📏 Distance: %.1fkm, Flexibility: %s → ±%s min", distance_km, flexibility_level, tolerance)
         else:
             tolerance = 30  # Fallback to default
-            logger.info(f"    ⚠️ Failed to calculate distance, using default tolerance: ±{tolerance} min")
+            logger.info("    ⚠️ Failed to calculate distance, using default tolerance: ±%s min", tolerance)
         
         if not _match_time(time, hitchhiker["departure_time"], tolerance):
-            logger.info(f"    ❌ Time mismatch: {time} vs {hitchhiker['departure_time']} (tolerance: ±{tolerance} min)")
+            logger.info("    ❌ Time mismatch: %s vs %s (tolerance: ±%s min)", time, hitchhiker['departure_time'], tolerance)
             continue
         
-        logger.info(f"    ✅ MATCH FOUND!")
+        # 🆕 Check destination compatibility (direct or on-route)
+        hitchhiker_dest = hitchhiker["destination"]
+        compatibility = compatibility_by_destination.get(hitchhiker_dest)
+        if compatibility is None:
+            compatibility = await _check_destination_compatibility(
+                driver_origin,
+                dest,
+                hitchhiker_dest,
+                driver,
+                driver_route_coords
+            )
+            compatibility_by_destination[hitchhiker_dest] = compatibility
+        is_match, match_type, details = compatibility
+        
+        if not is_match:
+            logger.info("    ❌ Destination incompatible")
+            continue
+        
+        logger.info("    ✅ Destination match (%s)", match_type)
+        if details:
+            hitchhiker["_match_details"] = details  # Store for notification
+        
+        logger.info("    ✅ MATCH FOUND!")
         matches.append(hitchhiker)
     
     logger.info(f"Found {len(matches)} hitchhikers for driver")
@@ -277,72 +416,108 @@ async def send_match_notifications(
     
     if role == "driver":
         # Driver added → notify hitchhikers about the driver
+        # Each hitchhiker is a different recipient - send concurrently (bounded)
         driver_msg = _format_driver_message(new_record)
-        for hitchhiker in matches:
-            await send_whatsapp_message(hitchhiker["phone_number"], driver_msg)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_NOTIFICATIONS)
+        
+        async def notify(hitchhiker_phone: str) -> bool:
+            async with semaphore:
+                return await send_whatsapp_message(hitchhiker_phone, driver_msg)
+        
+        await asyncio.gather(*(notify(hitchhiker["phone_number"]) for hitchhiker in matches))
         logger.info(f"✅ Notified {len(matches)} hitchhikers about new driver")
     
     elif role == "hitchhiker":
         # Hitchhiker added → notify hitchhiker about drivers (not drivers about hitchhiker)
+        # All drivers go to the same hitchhiker - combine them instead of one message per driver
         hitchhiker_phone = new_record.get("phone_number")
-        for driver in matches:
-            driver_msg = _format_driver_message(driver)
-            await send_whatsapp_message(hitchhiker_phone, driver_msg)
+        driver_msgs = [_format_driver_message(driver) for driver in matches]
+        for combined_msg in _combine_messages(driver_msgs):
+            await send_whatsapp_message(hitchhiker_phone, combined_msg)
         logger.info(f"✅ Notified hitchhiker about {len(matches)} drivers")
 
+def _combine_messages(messages: List[str], separator: str = "\n\n") -> List[str]:
+    """Join messages into as few WhatsApp messages as fit the size limit"""
+    combined = []
+    current = []
+    current_len = 0
+    for msg in messages:
+        added_len = len(msg) + (len(separator) if current else 0)
+        if current and current_len + added_len > WHATSAPP_MAX_MESSAGE_LENGTH:
+            combined.append(separator.join(current))
+            current = []
+            current_len = 0
+            added_len = len(msg)
+        current.append(msg)
+        current_len += added_len
+    if current:
+        combined.append(separator.join(current))
+    return combined
+
+@lru_cache(maxsize=1024)
+def _destination_key(destination: str) -> str:
+    """Canonical form for comparing destinations (NFC, trimmed, lowercased - cached per name)"""
+    return unicodedata.normalize("NFC", destination).strip().lower()
+
 def _match_destination(dest1: str, dest2: str) -> bool:
     """Fuzzy match destinations (80%+ similarity)"""
-    return fuzz.ratio(dest1.lower(), dest2.lower()) >= 80
+    return fuzz.ratio(_destination_key(dest1), _destination_key(dest2)) >= 80
+
 
+def _load_route_coords(driver_ride: Dict) -> Optional[List]:
+    """Get the ride's stored route as (lat, lon) pairs (None if not calculated yet)"""
+    # Handle both old format (nested arrays) and new format (flat array)
+    route_coords = driver_ride.get("route_coordinates")
+    
+    # If flat format, convert back to pairs
+    if not route_coords and driver_ride.get("route_coordinates_flat"):
+        flat_coords = driver_ride.get("route_coordinates_flat")
+        if flat_coords:  # Make sure we have data
+            # Convert [lat1,lon1,lat2,lon2] back to [(lat1,lon1), (lat2,lon2)]
+            route_coords = [(flat_coords[i], flat_coords[i+1]) for i in range(0, len(flat_coords), 2)]
+            logger.info(f"    📍 Loaded route with {len(route_coords)} points from DB")
+    
+    return route_coords
 
 async def _check_destination_compatibility(
     driver_origin: str,
     driver_dest: str,
     hitchhiker_dest: str,
-    driver_ride: Dict
-) -> tuple:
+    driver_ride: Dict,
+    route_coords: Optional[List] = None
+) -> CompatibilityResult:
     """
     Check if destinations are compatible (direct match or on-route)
     
+    Args:
+        route_coords: The driver's route if already loaded (saves re-decoding it per candidate)
+    
     Returns:
-        (is_match: bool, match_type: str, details: Optional[Dict])
+        CompatibilityResult (is_match, match_type, details)
     """
-    from typing import Optional, Tuple
-    
     # 1. Try direct fuzzy match first
     if _match_destination(driver_dest, hitchhiker_dest):
-        return True, "exact_match", None
+        return EXACT_MATCH
     
     # 2. Check if route data is available
-    # Handle both old format (nested arrays) and new format (flat array)
-    route_coords = driver_ride.get("route_coordinates")
-    
-    # If flat format, convert back to pairs
-    if not route_coords and driver_ride.get("route_coordinates_flat"):
-        flat_coords = driver_ride.get("route_coordinates_flat")
-        if flat_coords:  # Make sure we have data
-            num_points = driver_ride.get("route_num_points", len(flat_coords) // 2)
-            # Convert [lat1,lon1,lat2,lon2] back to [(lat1,lon1), (lat2,lon2)]
-            route_coords = [(flat_coords[i], flat_coords[i+1]) for i in range(0, len(flat_coords), 2)]
-            logger.info(f"    📍 Loaded route with {len(route_coords)} points from DB")
+    if route_coords is None:
+        route_coords = _load_route_coords(driver_ride)
     
     route_threshold = driver_ride.get("route_threshold_km")
     
     # 🆕 If route calculation is still pending, skip on-route check for now
     if driver_ride.get("route_calculation_pending") and not route_coords:
         logger.info(f"    ⏳ Route calculation still in progress, skipping on-route check")
-        return False, None, None
+        return NO_MATCH
     
     if not route_coords:
         # Lazy loading for old rides without route data
         logger.info(f"    💤 Lazy loading route for {driver_origin} → {driver_dest}")
-        from services.route_service import get_route_data
-        
         route_data = await get_route_data(driver_origin, driver_dest)
         
         if not route_data:
             logger.info(f"    ❌ Failed to calculate route")
-            return False, None, None
+            return NO_MATCH
         
         # Save for next time
         from database import update_ride_route_data
@@ -356,23 +531,16 @@ async def _check_destination_compatibility(
         route_threshold = route_data["threshold_km"]
     
     # 3. Calculate minimum distance from hitchhiker destination to route
-    from services.route_service import (
-        geocode_address, 
-        calculate_min_distance_to_route, 
-        calculate_dynamic_threshold,
-        calculate_distance_between_points
-    )
-    
     hitchhiker_coords = geocode_address(hitchhiker_dest)
     if not hitchhiker_coords:
         logger.info(f"    ❌ Failed to geocode hitchhiker destination: {hitchhiker_dest}")
-        return False, None, None
+        return NO_MATCH
     
     # 🆕 Calculate distance from driver origin to hitchhiker destination
     driver_origin_coords = geocode_address(driver_origin)
     if not driver_origin_coords:
         logger.info(f"    ❌ Failed to geocode driver origin: {driver_origin}")
-        return False, None, None
+        return NO_MATCH
     
     distance_from_origin = calculate_distance_between_points(driver_origin_coords, hitchhiker_coords)
     
@@ -380,7 +548,7 @@ async def _check_destination_compatibility(
     # A hitchhiker needs to ARRIVE at their destination, not depart from it
     if distance_from_origin < 0.5:  # Less than 500m = same location
         logger.info(f"    ❌ Hitchhiker destination is driver's origin - not a valid match")
-        return False, None, None
+        return NO_MATCH
     
     # 🆕 Calculate dynamic threshold based on distance from origin
     dynamic_threshold = calculate_dynamic_threshold(distance_from_origin)
@@ -392,23 +560,41 @@ async def _check_destination_compatibility(
     logger.info(f"    📏 Distance from route: {min_distance:.1f}km")
     
     if min_distance <= dynamic_threshold:
-        return True, "on_route", {
+        return CompatibilityResult(True, "on_route", {
             "distance": min_distance,
             "threshold": dynamic_threshold,
             "distance_from_origin": distance_from_origin
-        }
+        })
     
-    return False, None, None
+    return NO_MATCH
+
+@lru_cache(maxsize=512)
+def _weekday_name(date_str: str) -> str:
+    """Weekday name for a YYYY-MM-DD date, as stored in driver days (cached - few distinct dates per scan)"""
+    return datetime.strptime(date_str, "%Y-%m-%d").strftime("%A")
+
+@lru_cache(maxsize=2048)
+def _time_to_minutes(value: str) -> Optional[int]:
+    """Parse "HH:MM" to minutes since midnight (cached - a search compares one time against every candidate)"""
+    try:
+        hours, minutes = map(int, value.split(":"))
+        return hours * 60 + minutes
+    except (ValueError, AttributeError):
+        # Malformed or missing time ("8", "", None)
+        return None
 
 def _match_time(time1: str, time2: str, tolerance: int = 30) -> bool:
     """Check if times are close (within tolerance minutes)"""
     try:
-        h1, m1 = map(int, time1.split(":"))
-        h2, m2 = map(int, time2.split(":"))
-        diff = abs((h1 * 60 + m1) - (h2 * 60 + m2))
-        return diff <= tolerance
-    except:
+        minutes1 = _time_to_minutes(time1)
+        minutes2 = _time_to_minutes(time2)
+    except TypeError:
+        # Unhashable value can't go through the cache - not a time anyway
         return False
+    if minutes1 is None or minutes2 is None:
+        # Malformed or missing time - never a match
+        return False
+    return abs(minutes1 - minutes2) <= tolerance
 
 def _calculate_time_tolerance(flexibility_level: str, distance_km: float) -> int:
     """
@@ -455,17 +641,6 @@ def _calculate_time_tolerance(flexibility_level: str, distance_km: float) -> int
 
 def _format_driver_message(driver: Dict) -> str:
     """Format driver match notification"""
-    # Day translation map
-    DAY_TRANSLATION = {
-        "Sunday": "א'",
-        "Monday": "ב'",
-        "Tuesday": "ג'",
-        "Wednesday": "ד'",
-        "Thursday": "ה'",
-        "Friday": "ו'",
-        "Saturday": "ש'"
-    }
-    
     if driver.get("days"):
         # Recurring driver - translate days to Hebrew
         hebrew_days = [DAY_TRANSLATION.get(d, d[:3]) for d in driver.get("days", [])]
@@ -477,58 +652,34 @@ def _format_driver_message(driver: Dict) -> str:
     else:
         time_info = ""
     
-    # Get driver name, handle None case
-    driver_name = driver.get('name') or 'נהג'
-    
-    msg = f"""🚗 נמצא נהג!
-
-{driver_name} נוסע ל{driver['destination']}
-{time_info}
-שעה: {driver['departure_time']}"""
-    
     # 🆕 Add on-route information if this is an on-route match
     match_details = driver.get("_match_details")
-    if match_details:
-        distance = match_details["distance"]
-        msg += f"\n\n📍 היעד שלך נמצא בדרך ({distance:.1f} ק\"מ מהמסלול)"
-    
-    msg += f"""
-
-📱 טלפון: +{driver['phone_number']}
-
-בהצלחה! 🙂"""
-    
-    return msg
+    route_note = DRIVER_ROUTE_NOTE.format(distance=match_details["distance"]) if match_details else ""
+    
+    return DRIVER_MATCH_TEMPLATE.format(
+        name=driver.get('name') or 'נהג',
+        destination=driver['destination'],
+        time_info=time_info,
+        departure_time=driver['departure_time'],
+        route_note=route_note,
+        phone_number=driver['phone_number']
+    )
 
 def _format_hitchhiker_message(hitchhiker: Dict, destination: str) -> str:
     """Format hitchhiker match notification"""
-    # Translate flexibility level to Hebrew
-    flexibility_hebrew = {
-        "strict": "זמן קבוע ⏰",
-        "flexible": "גמיש 🟡",
-        "very_flexible": "מאוד גמיש 🟢"
-    }
-    
     flexibility_level = hitchhiker.get("flexibility", "flexible")
-    flex_text = flexibility_hebrew.get(flexibility_level, "גמיש 🟡")
-    
-    msg = f"""🎒 נמצא טרמפיסט!
-
-{hitchhiker.get('name', 'טרמפיסט')} מחפש/ת נסיעה ל{hitchhiker.get('destination', destination)}
-תאריך: {hitchhiker.get('travel_date')}
-שעה: {hitchhiker.get('departure_time')}
-גמישות: {flex_text}"""
+    flex_text = FLEXIBILITY_HEBREW.get(flexibility_level, "גמיש 🟡")
     
     # 🆕 Add on-route information if this is an on-route match
     match_details = hitchhiker.get("_match_details")
-    if match_details:
-        distance = match_details["distance"]
-        msg += f"\n\n📍 היעד שלו/ה בדרך אליך ({distance:.1f} ק\"מ מהמסלול שלך)"
-    
-    msg += f"""
-
-📱 טלפון: +{hitchhiker['phone_number']}
-
-בהצלחה! 🙂"""
-    
-    return msg
+    route_note = HITCHHIKER_ROUTE_NOTE.format(distance=match_details["distance"]) if match_details else ""
+    
+    return HITCHHIKER_MATCH_TEMPLATE.format(
+        name=hitchhiker.get('name', 'טרמפיסט'),
+        destination=hitchhiker.get('destination', destination),
+        travel_date=hitchhiker.get('travel_date'),
+        departure_time=hitchhiker.get('departure_time'),
+        flexibility=flex_text,
+        route_note=route_note,
+        phone_number=hitchhiker['phone_number']
+    )
@@ -6,10 +6,12 @@ Handles route calculation, geocoding, and distance calculations with dynamic thr
 import logging
 import asyncio
 import json
+import math
 import os
 from typing import Optional, Dict, List, Tuple
 from functools import lru_cache
 import requests
+from requests.adapters import HTTPAdapter
 from geopy.distance import distance as geopy_distance
 
 from config import (
@@ -27,6 +29,17 @@ from config import (
 
 logger = logging.getLogger(__name__)
 
+# Flat-earth prefilter for route distance: keep points within 2% (+ ~100m) of the
+# approximate nearest one - well above the approximation error at Israel's scale
+_APPROX_DISTANCE_MARGIN = 0.02
+_APPROX_DISTANCE_SLACK_DEG = 0.001
+
+# One pooled session per process for OSRM / Google / Nominatim - keeps the
+# connections to each host alive instead of a new handshake per lookup
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=3, pool_maxsize=10))
+_session.mount("http://", HTTPAdapter(pool_connections=3, pool_maxsize=10))
+
 # Global task tracker to prevent race conditions
 _active_route_tasks = {}  # {ride_id: task}
 
@@ -145,7 +158,7 @@ def _geocode_with_google(address: str) -> Optional[Tuple[float, float]]:
             'language': 'iw'  # Hebrew
         }
         
-        response = requests.get(url, params=params, timeout=API_TIMEOUT_SECONDS)
+        response = _session.get(url, params=params, timeout=API_TIMEOUT_SECONDS)
         response.raise_for_status()
         
         data = response.json()
@@ -186,7 +199,7 @@ def _geocode_with_nominatim(address: str) -> Optional[Tuple[float, float]]:
             'User-Agent': NOMINATIM_USER_AGENT
         }
         
-        response = requests.get(
+        response = _session.get(
             NOMINATIM_API_URL + "/search",
             params=params,
             headers=headers,
@@ -225,6 +238,11 @@ def geocode_address(address: str) -> Optional[Tuple[float, float]]:
     Returns:
         (latitude, longitude) or None if all services failed
     """
+    # Nothing to look up - don't spend Google/Nominatim requests on a blank address
+    if not isinstance(address, str) or not address.strip():
+        logger.warning("⚠️ Skipping geocoding for empty address")
+        return None
+    
     try:
         # Try local database first (fast and accurate for Israeli settlements)
         settlements_db = _load_settlements_database()
@@ -298,13 +316,22 @@ def calculate_min_distance_to_route(
     if not route_coords:
         return float('inf')
     
-    min_dist = float('inf')
+    # Rank route points with a cheap flat-earth distance first (plain float math),
+    # then run the exact geodesic only on the points that can be the nearest one
+    lat0, lon0 = location_coords
+    lon_scale = math.cos(math.radians(lat0))
+    approx = [
+        math.hypot(lat - lat0, (lon - lon0) * lon_scale)
+        for lat, lon in route_coords
+    ]
+    approx_min = min(approx)
+    cutoff = approx_min * (1 + _APPROX_DISTANCE_MARGIN) + _APPROX_DISTANCE_SLACK_DEG
     
-    for route_point in route_coords:
-        dist = geopy_distance(location_coords, route_point).kilometers
-        min_dist = min(min_dist, dist)
-    
-    return min_dist
+    return min(
+        geopy_distance(location_coords, route_point).kilometers
+        for route_point, approx_dist in zip(route_coords, approx)
+        if approx_dist <= cutoff
+    )
 
 
 def _parse_osrm_geometry(geometry: Dict, target_resolution_km: float = 1.0) -> List[Tuple[float, float]]:
@@ -407,7 +434,7 @@ async def get_route_data(origin: str, destination: str) -> Optional[Dict]:
         loop = asyncio.get_event_loop()
         response = await loop.run_in_executor(
             None,
-            lambda: requests.get(url, params=params, timeout=API_TIMEOUT_SECONDS)
+            lambda: _session.get(url, params=params, timeout=API_TIMEOUT_SECONDS)
         )
         response.raise_for_status()
         
@@ -472,16 +499,13 @@ async def calculate_and_save_route_background(
     if max_retries is None:
         max_retries = ROUTE_CALC_MAX_RETRIES
     
-    # Cancel old task if exists (user updated quickly)
-    if ride_id in _active_route_tasks:
-        old_task = _active_route_tasks[ride_id]
-        if not old_task.done():
-            old_task.cancel()
-            logger.info(f"🚫 Cancelled old route calculation for {ride_id}")
-    
-    # Register current task
+    # Register current task, cancelling the old one if exists (user updated quickly)
     task = asyncio.current_task()
+    old_task = _active_route_tasks.get(ride_id)
     _active_route_tasks[ride_id] = task
+    if old_task is not None and old_task is not task and not old_task.done():
+        old_task.cancel()
+        logger.info(f"🚫 Cancelled old route calculation for {ride_id}")
     
     try:
         for attempt in range(1, max_retries + 1):
@@ -496,34 +520,23 @@ async def calculate_and_save_route_background(
                 
                 # Save to DB
                 from database import update_ride_route_data
-                success = await update_ride_route_data(
+                updated_ride = await update_ride_route_data(
                     phone_number,
                     ride_id,
                     route_data,
                     collection_prefix
                 )
                 
-                if success:
+                if updated_ride:
                     logger.info(f"✅ Route saved in background for {ride_id}: {route_data['distance_km']:.1f}km")
                     
                     # 🆕 Re-run matching now that route is available
                     try:
                         logger.info(f"🔍 Re-running match search after route calculation...")
-                        from database import get_user_rides_and_requests
                         from services.matching_service import find_matches_for_new_record, send_match_notifications
                         
-                        # Get updated ride with route data
-                        user_data = await get_user_rides_and_requests(phone_number, collection_prefix)
-                        driver_rides = user_data.get("driver_rides", [])
-                        
-                        # Find the specific ride
-                        updated_ride = None
-                        for ride in driver_rides:
-                            if ride.get("id") == ride_id:
-                                updated_ride = ride
-                                break
-                        
-                        if updated_ride:
+                        # The saved ride (with route data) comes back from the update - no re-fetch needed
+                        if updated_ride.get("active", True):
                             # Add phone for matching
                             updated_ride["phone_number"] = phone_number
                             
@@ -542,7 +555,7 @@ async def calculate_and_save_route_background(
                                 )
                                 logger.info(f"✅ Sent notifications for {len(matches)} post-route matches")
                         else:
-                            logger.warning(f"⚠️ Could not find ride {ride_id} for post-route matching")
+                            logger.warning(f"⚠️ Ride {ride_id} is no longer active, skipping post-route matching")
                             
                     except Exception as e:
                         logger.error(f"❌ Error in post-route matching: {e}", exc_info=True)
@@ -564,6 +577,8 @@ async def calculate_and_save_route_background(
                     logger.error(f"❌ All retry attempts failed for {ride_id}. Will use lazy loading.")
     
     finally:
-        # Cleanup
-        _active_route_tasks.pop(ride_id, None)
+        # Cleanup - only if we're still the registered task; a cancelled old
+        # task must not unregister the newer calculation that replaced it
+        if _active_route_tasks.get(ride_id) is task:
+            del _active_route_tasks[ride_id]
 
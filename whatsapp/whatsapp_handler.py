@@ -20,6 +20,18 @@ _processing_users = {}
 _processing_lock = asyncio.Lock()
 
 
+async def _release_processing(from_number: str, started_at: datetime) -> None:
+    """
+    Remove the user's processing entry - but only if it is still ours.
+    A stale entry may have been replaced by a newer message; that newer
+    handler owns the entry now and must not be released by the old one.
+    """
+    async with _processing_lock:
+        if started_at is not None and _processing_users.get(from_number) is started_at:
+            del _processing_users[from_number]
+            logger.debug(f"✅ Released processing lock for {from_number}")
+
+
 async def handle_whatsapp_message(message: Dict[str, Any]) -> bool:
     """
     Handle a single WhatsApp message
@@ -30,6 +42,7 @@ async def handle_whatsapp_message(message: Dict[str, Any]) -> bool:
     Returns:
         True if handled successfully
     """
+    started_at = None
     try:
         from_number = message.get("from")
         message_type = message.get("type")
@@ -44,8 +57,9 @@ async def handle_whatsapp_message(message: Dict[str, Any]) -> bool:
         
         # 🔒 Check if this user is already being processed
         async with _processing_lock:
+            now = datetime.now()  # One clock read for both the staleness check and the new entry
             if from_number in _processing_users:
-                time_diff = (datetime.now() - _processing_users[from_number]).total_seconds()
+                time_diff = (now - _processing_users[from_number]).total_seconds()
                 if time_diff < 60:  # Still processing if less than 60 seconds
                     logger.warning(f"⏳ User {from_number} already being processed ({time_diff:.1f}s ago), skipping duplicate message")
                     await send_whatsapp_message(from_number, "רגע, אני עדיין מעבד את ההודעה הקודמת שלך... 🔄")
@@ -56,7 +70,8 @@ async def handle_whatsapp_message(message: Dict[str, Any]) -> bool:
                     del _processing_users[from_number]
             
             # Mark user as being processed
-            _processing_users[from_number] = datetime.now()
+            started_at = now
+            _processing_users[from_number] = started_at
         
         if message_type == "text":
             message_text = message["text"]["body"]
@@ -76,26 +91,23 @@ async def handle_whatsapp_message(message: Dict[str, Any]) -> bool:
                 if admin_response:
                     await send_whatsapp_message(from_number, admin_response)
                     # Remove from processing
-                    async with _processing_lock:
-                        if from_number in _processing_users:
-                            del _processing_users[from_number]
+                    await _release_processing(from_number, started_at)
                     return True
             
-            # Get or create user (with name)
-            user_data, is_new_user = await get_or_create_user(from_number, user_name)
+            # Get or create user (with name) - a new user is created with
+            # this first message already in history so history is complete
+            user_data, is_new_user = await get_or_create_user(
+                from_number, user_name, first_message=message_text
+            )
             
             # Send welcome message to new users and skip AI processing
             if is_new_user:
                 welcome_msg = get_welcome_message(user_name)
-                # Save the user's first message so history is complete
-                await add_message_to_history(from_number, "user", message_text)
                 # send_whatsapp_message saves assistant message to history
                 await send_whatsapp_message(from_number, welcome_msg)
                 logger.info(f"👋 משתמש חדש: {user_display}")
                 # Remove from processing
-                async with _processing_lock:
-                    if from_number in _processing_users:
-                        del _processing_users[from_number]
+                await _release_processing(from_number, started_at)
                 # Don't process first message with AI - welcome is enough
                 return True
             
@@ -105,26 +117,19 @@ async def handle_whatsapp_message(message: Dict[str, Any]) -> bool:
                 return True
             finally:
                 # 🔓 Remove user from processing set
-                async with _processing_lock:
-                    if from_number in _processing_users:
-                        del _processing_users[from_number]
-                        logger.debug(f"✅ Released processing lock for {from_number}")
+                await _release_processing(from_number, started_at)
         
         else:
             # Non-text message
             await send_whatsapp_message(from_number, NON_TEXT_MESSAGE_HEBREW)
             # Remove from processing
-            async with _processing_lock:
-                if from_number in _processing_users:
-                    del _processing_users[from_number]
+            await _release_processing(from_number, started_at)
             return True
     
     except Exception as e:
         logger.error(f"❌ Error handling message: {str(e)}", exc_info=True)
         # Clean up processing lock on error
-        async with _processing_lock:
-            if from_number in _processing_users:
-                del _processing_users[from_number]
+        await _release_processing(from_number, started_at)
         return False
 
 
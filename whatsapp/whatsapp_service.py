@@ -3,13 +3,29 @@ WhatsApp messaging service
 Handles sending messages via WhatsApp Cloud API
 """
 
+import asyncio
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
-from config import WHATSAPP_TOKEN, WHATSAPP_API_URL, WHATSAPP_PHONE_NUMBER_ID
+from config import WHATSAPP_TOKEN, WHATSAPP_API_URL, WHATSAPP_PHONE_NUMBER_ID, TEST_USERS
 
 logger = logging.getLogger(__name__)
 
+# Resolved once at import - config is static for the life of the process
+_TEST_USERS = frozenset(TEST_USERS)
+_WHATSAPP_CONFIGURED = bool(WHATSAPP_TOKEN and WHATSAPP_PHONE_NUMBER_ID)
+_WHATSAPP_HEADERS = {
+    "Authorization": f"Bearer {WHATSAPP_TOKEN}",
+    "Content-Type": "application/json"
+}
+
+# One pooled session per process - reuses the TLS connection to the Graph API
+# instead of a new handshake for every outgoing message
+_session = requests.Session()
+_session.headers.update(_WHATSAPP_HEADERS)
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
 
 async def send_whatsapp_message(phone_number: str, message: str) -> bool:
     """
@@ -27,15 +43,14 @@ async def send_whatsapp_message(phone_number: str, message: str) -> bool:
     Returns:
         True if successful, False otherwise
     """
-    from config import TEST_USERS
     from database import add_message_to_history
     
     try:
         # Check if this is a test user
-        if phone_number in TEST_USERS:
-            logger.info(f"🧪 ═══ TEST USER - SAVING TO HISTORY (NO WHATSAPP) ═══")
-            logger.info(f"📱 User: {phone_number}")
-            logger.info(f"💬 Message ({len(message)} chars):\n{message}")
+        if phone_number in _TEST_USERS:
+            logger.info("🧪 ═══ TEST USER - SAVING TO HISTORY (NO WHATSAPP) ═══")
+            logger.info("📱 User: %s", phone_number)
+            logger.info("💬 Message (%d chars):\n%s", len(message), message)
             
             # Save to regular chat history instead of sending WhatsApp
             # Test users are in the same database as regular users
@@ -45,22 +60,17 @@ async def send_whatsapp_message(phone_number: str, message: str) -> bool:
                 message
             )
             
-            logger.info(f"✅ Message saved to chat history for test user (no WhatsApp sent)")
+            logger.info("✅ Message saved to chat history for test user (no WhatsApp sent)")
             return True
         
-        if not WHATSAPP_TOKEN or not WHATSAPP_PHONE_NUMBER_ID:
+        if not _WHATSAPP_CONFIGURED:
             logger.warning("WhatsApp credentials not configured")
             return False
         
         # Log outgoing message
-        logger.info(f"📤 ═══ SENDING TO WHATSAPP ═══")
-        logger.info(f"📱 To: {phone_number}")
-        logger.info(f"💬 Message ({len(message)} chars):\n{message}")
-        
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-            "Content-Type": "application/json"
-        }
+        logger.info("📤 ═══ SENDING TO WHATSAPP ═══")
+        logger.info("📱 To: %s", phone_number)
+        logger.info("💬 Message (%d chars):\n%s", len(message), message)
         
         payload = {
             "messaging_product": "whatsapp",
@@ -69,19 +79,20 @@ async def send_whatsapp_message(phone_number: str, message: str) -> bool:
             "text": {"body": message}
         }
         
-        response = requests.post(WHATSAPP_API_URL, headers=headers, json=payload)
+        # Blocking HTTP call - run it off the event loop so other webhooks keep flowing
+        response = await asyncio.to_thread(_session.post, WHATSAPP_API_URL, json=payload)
         response.raise_for_status()
         
-        logger.info(f"✅ WhatsApp API Response: {response.status_code}")
+        logger.info("✅ WhatsApp API Response: %s", response.status_code)
         
         # Save to chat history after successful send
         await add_message_to_history(phone_number, "assistant", message)
-        logger.info(f"✅ Message saved to chat history")
+        logger.info("✅ Message saved to chat history")
         
         return True
     
     except Exception as e:
-        logger.error(f"❌ Error sending WhatsApp message: {str(e)}")
+        logger.error("❌ Error sending WhatsApp message: %s", e)
         return False
 
 